@@ -0,0 +1,6 @@
+import sys
+
+sys.dont_write_bytecode = True
+from .server import StubServer
+from .probe import Probe
+from .runner import Bench
@@ -0,0 +1,48 @@
+import sys
+import os
+import json
+
+sys.dont_write_bytecode = True
+sys.stdout.reconfigure(encoding="utf-8")
+from . import Bench
+
+# usage: python -m bench under ScienceBoard_CODA
+# BENCH_VM_LATENCY accepts JSON, e.g. '{"revert": 2.0}'
+# BENCH_IMAGE_POLICY accepts JSON, e.g. '{"format": "JPEG", "quality": 80}'
+if __name__ == "__main__":
+    bench = Bench(
+        tasks=int(os.environ.get("BENCH_TASKS", 16)),
+        steps=int(os.environ.get("BENCH_STEPS", 5)),
+        vms=int(os.environ.get("BENCH_VMS", 1)),
+        standby=os.environ.get("STANDBY", "0") == "1",
+        asynchronous=os.environ.get("ASYNCHRONOUS", "0") == "1",
+        community=os.environ.get("BENCH_COMMUNITY", "aio"),
+        pipeline=os.environ.get("BENCH_PIPELINE", "0") == "1",
+        obs_types=os.environ.get("BENCH_OBS", "screenshot").split(","),
+        screen_size=tuple(
+            int(size) for size in
+            os.environ.get("BENCH_SCREEN", "1280x800").split("x")
+        ),
+        a11y_nodes=int(os.environ.get("BENCH_A11Y_NODES", 200)),
+        model_latency=float(os.environ.get("BENCH_MODEL_LATENCY", 0.5)),
+        replicas=int(os.environ.get("BENCH_REPLICAS", 1)),
+        stream=os.environ.get("BENCH_STREAM", "0") == "1",
+        vm_latency=json.loads(os.environ.get("BENCH_VM_LATENCY", "{}")),
+        failure=float(os.environ.get("BENCH_FAILURE", 0)),
+        action_interval=float(os.environ.get("BENCH_ACTION_INTERVAL", 0)),
+        image_policy=json.loads(os.environ.get("BENCH_IMAGE_POLICY", "{}")),
+        cache_path=os.environ.get("BENCH_CACHE_PATH"),
+        cache_mode=os.environ.get("BENCH_CACHE_MODE", "record"),
+        context_window=int(os.environ.get("BENCH_CONTEXT_WINDOW", 15)),
+        context_images=int(os.environ["BENCH_CONTEXT_IMAGES"]) if "BENCH_CONTEXT_IMAGES" in os.environ else None,
+        history_style=os.environ.get("BENCH_HISTORY", "drop"),
+        history_images=int(os.environ["BENCH_HISTORY_IMAGES"]) if "BENCH_HISTORY_IMAGES" in os.environ else None,
+        budget=float(os.environ["BENCH_BUDGET"]) if "BENCH_BUDGET" in os.environ else None,
+        logs_path=os.environ.get("BENCH_LOGS_PATH")
+    )
+
+    report = bench()
+    print(Bench.format(report))
+    if "BENCH_OUTPUT" in os.environ:
+        with open(os.environ["BENCH_OUTPUT"], mode="w", encoding="utf-8") as writable:
+            json.dump(report, writable, indent=2)
@@ -0,0 +1,248 @@
+import sys
+import os
+import re
+import json
+import time
+import random
+
+from typing import Optional, List, Dict, Any, Callable
+
+sys.dont_write_bytecode = True
+from sci.base.grammar import GRAMMARS
+from sci.base.prompt import CodeLike, Primitive
+
+from .server import StubServer
+
+
+# parsing as it was before grammar.py, kept as the baseline
+# patterns are strings, composed and compiled again on each call
+class Legacy:
+    ANTIQUOT = r'```(?:\w*\s+)?([\w\W]*?)```'
+
+    @staticmethod
+    def antiquot(text: str) -> List[str]:
+        return [match.group(1).strip() for match in re.finditer(Legacy.ANTIQUOT, text)]
+
+    @staticmethod
+    def atlas(text: str) -> List[str]:
+        pat_click = r'CLICK <point>\[\[(\d+), ?(\d+)\]\]</point>'
+        pat_type = r'TYPE \[(.+?)\]'
+        pat_scroll = r'SCROLL \[(UP|DOWN|LEFT|RIGHT)\]'
+        pat_atlas = fr'({pat_click}|{pat_type}|{pat_scroll})'
+
+        def parse(code: str) -> str:
+            if (match_obj := re.match(pat_click, code)) is not None:
+                return f"pyautogui.click({int(match_obj[1]) / 1000}, {int(match_obj[2]) / 1000})"
+            elif (match_obj := re.match(pat_type, code)) is not None:
+                return f"pyautogui.typewrite({json.dumps(match_obj[1])}, interval=0.1)"
+            elif (match_obj := re.match(pat_scroll, code)) is not None:
+                return {
+                    "UP": "pyautogui.scroll(10)",
+                    "DOWN": "pyautogui.scroll(-10)",
+                    "LEFT": "pyautogui.hscroll(-10)",
+                    "RIGHT": "pyautogui.hscroll(10)"
+                }[match_obj[1]]
+
+        return [
+            parse(match.group(1).strip())
+            for match in re.finditer(pat_atlas, text)
+        ]
+
+    @staticmethod
+    def uground(text: str) -> List[str]:
+        def parse(code: str) -> str:
+            match_obj = re.match(r'\((\d+), ?(\d+)\)', code)
+            return f"pyautogui.click({int(match_obj[1]) / 1000}, {int(match_obj[2]) / 1000})"
+
+        return [
+            parse(match.group(1).strip())
+            for match in re.finditer(r'(\(\d+, ?\d+\))', text)
+        ]
+
+    @staticmethod
+    def qwen_vl(text: str) -> List[str]:
+        action_str = text.split("Action:")[-1].strip(';')
+        return Legacy.antiquot("```\n" + action_str + "```")
+
+    @staticmethod
+    def reasoning(text: str) -> List[str]:
+        match = re.search(r"<code>(.*?)</code>", text, re.DOTALL)
+        parsed_code = match.group(1).strip() if match else ""
+        return Legacy.antiquot("```\n" + parsed_code + "```")
+
+    planner = antiquot
+
+    # actions of AllInOne were wrapped in ``` as they were, so fenced ones
+    # were split around their blocks, keeping the text outside instead
+    @staticmethod
+    def fenced(code_style: str, text: str) -> bool:
+        if code_style == "qwen_vl":
+            return "```" in text.split("Action:")[-1]
+        if code_style == "reasoning":
+            match = re.search(r"<code>(.*?)</code>", text, re.DOTALL)
+            return match is not None and "```" in match.group(1)
+        return False
+
+    # Agent.complete() as it was, run on each chunk of streams
+    @staticmethod
+    def complete(code_style: str, text: str) -> bool:
+        primitives = set(Primitive.PRIMITIVES)
+        codes = getattr(Legacy, code_style)(text)
+        if code_style == "planner":
+            return any(
+                any(code.startswith(primitive) for primitive in primitives)
+                for code in codes
+            )
+        return len(codes) > 0
+
+
+# micro-benchmark of action parsing, legacy against grammars
+# - corpus: model responses recorded by ResponseCache, or synthesized
+# - every style parses every response, matched or not, as models
+#   of one style may well answer in the format of another
+# - results must be the same as those of legacy, except for
+#   fenced actions of AllInOne, which are unfenced now, see Legacy.fenced()
+# - prefixes: responses are checked word by word as well
+#   as Agent.complete() does for streamed completions
+#   only in code styles of agents, i.e. with CodeLike.wrap_*()
+class Parsing:
+    THOUGHT = StubServer.RAMBLE
+
+    def __init__(
+        self,
+        corpus_path: Optional[str] = None,
+        size: int = 200,
+        repeat: int = 20,
+        seed: int = 0
+    ) -> None:
+        self.corpus = Parsing.load(corpus_path) if corpus_path is not None \
+            else Parsing.synthesize(size, random.Random(seed))
+        assert len(self.corpus) > 0
+
+        assert isinstance(repeat, int) and repeat > 0
+        self.repeat = repeat
+
+    # content of responses in openai or anthropic style
+    @staticmethod
+    def load(corpus_path: str) -> List[str]:
+        corpus = []
+        for file_name in sorted(os.listdir(corpus_path)):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(corpus_path, file_name), mode="r", encoding="utf-8") as readable:
+                try:
+                    body = json.loads(json.load(readable)["content"])
+                except (KeyError, ValueError):
+                    continue
+            if "choices" in body:
+                corpus.append(body["choices"][0]["message"]["content"])
+            elif "content" in body:
+                corpus.append(body["content"][0]["text"])
+        return corpus
+
+    @staticmethod
+    def synthesize(size: int, rng: random.Random) -> List[str]:
+        thought = lambda: " ".join(
+            Parsing.THOUGHT.split(". ")[:rng.randint(1, 4)]
+        )
+        point = lambda: (rng.randint(0, 999), rng.randint(0, 999))
+        templates: List[Callable[[], str]] = [
+            lambda: f"{thought()}\n```python\npyautogui.click{point()}\n```",
+            lambda: f"{thought()}\n```\npyautogui.typewrite('hello world')\n```\n{thought()}",
+            lambda: f"{thought()}\n```\nDONE\n```",
+            lambda: f"{thought()}\nCLICK <point>[[{point()[0]}, {point()[1]}]]</point>",
+            lambda: f"{thought()}\nTYPE [{thought()[:24]}]\nSCROLL [{rng.choice(['UP', 'DOWN'])}]",
+            lambda: f"{thought()} The target is at {point()}.",
+            lambda: f"Thought: {thought()}\nAction: pyautogui.click{point()};",
+            lambda: f"<think>{thought()}</think>\n<code>pyautogui.click{point()}; pyautogui.press('enter')</code>"
+        ]
+        return [rng.choice(templates)() for _ in range(size)]
+
+    @staticmethod
+    def prefixes(text: str) -> List[str]:
+        ends = [match.end() for match in re.finditer(r'\S+', text)]
+        return [text[:end] for end in ends]
+
+    # best of `repeat` passes, as noise of shared hosts only adds up
+    def __time(self, parse: Callable[[str], Any], texts: List[str]) -> float:
+        best = float("inf")
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            for text in texts:
+                parse(text)
+            best = min(best, time.perf_counter() - start)
+        return best / len(texts)
+
+    def __call__(self) -> Dict[str, Any]:
+        streamed = [prefix for text in self.corpus for prefix in Parsing.prefixes(text)]
+        styles = {}
+        for code_style, grammar in GRAMMARS.items():
+            legacy = getattr(Legacy, code_style)
+            engine = lambda text: [action.render() for action in grammar(text)]
+            fenced = [Legacy.fenced(code_style, text) for text in self.corpus]
+            mismatches = sum(
+                legacy(text) != engine(text)
+                for text, unfenced in zip(self.corpus, fenced)
+                if not unfenced
+            )
+            assert mismatches == 0, f"{mismatches} response(s) parsed differently in {code_style}"
+            styles[code_style] = {
+                "actions": sum(len(grammar(text)) for text in self.corpus),
+                "fenced": sum(fenced),
+                "legacy": self.__time(legacy, self.corpus),
+                "engine": self.__time(engine, self.corpus)
+            }
+            if hasattr(CodeLike, f"wrap_{code_style}"):
+                styles[code_style] |= {
+                    "legacy_streamed": self.__time(
+                        lambda text: Legacy.complete(code_style, text),
+                        streamed
+                    ),
+                    "engine_streamed": self.__time(
+                        lambda text: CodeLike.complete(code_style, text),
+                        streamed
+                    )
+                }
+        return {
+            "responses": len(self.corpus),
+            "prefixes": len(streamed),
+            "repeat": self.repeat,
+            "styles": styles
+        }
+
+    @staticmethod
+    def format(report: Dict[str, Any]) -> str:
+        lines = [
+            f"corpus: {report['responses']} responses, "
+                f"{report['prefixes']} prefixes, best of {report['repeat']} passes",
+            "parse: all actions of responses; complete: one check per prefix",
+            "fenced: responses of fenced actions, unfenced unlike legacy",
+            f"{'style':<12}{'actions':>9}{'fenced':>8}"
+                f"{'parse/us':>12}{'engine/us':>12}{'speedup':>9}"
+                f"{'complete/us':>13}{'engine/us':>12}{'speedup':>9}"
+        ]
+        for code_style, stat in report["styles"].items():
+            line = f"{code_style:<12}{stat['actions']:>9}{stat['fenced']:>8}" \
+                f"{stat['legacy'] * 1e6:>12.2f}{stat['engine'] * 1e6:>12.2f}" \
+                f"{stat['legacy'] / stat['engine']:>8.2f}x"
+            if "legacy_streamed" in stat:
+                line += f"{stat['legacy_streamed'] * 1e6:>13.2f}" \
+                    f"{stat['engine_streamed'] * 1e6:>12.2f}" \
+                    f"{stat['legacy_streamed'] / stat['engine_streamed']:>8.2f}x"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+# usage: python -m bench.parsing under ScienceBoard_CODA
+# BENCH_CORPUS is a directory of ResponseCache, e.g. BENCH_CACHE_PATH
+if __name__ == "__main__":
+    parsing = Parsing(
+        corpus_path=os.environ.get("BENCH_CORPUS"),
+        size=int(os.environ.get("BENCH_CORPUS_SIZE", 200)),
+        repeat=int(os.environ.get("BENCH_REPEAT", 20))
+    )
+    report = parsing()
+    print(Parsing.format(report))
+    if "BENCH_OUTPUT" in os.environ:
+        with open(os.environ["BENCH_OUTPUT"], mode="w", encoding="utf-8") as writable:
+            json.dump(report, writable, indent=2)
@@ -0,0 +1,93 @@
+import sys
+import time
+import inspect
+import functools
+import threading
+
+from typing import List, Tuple, Dict, Optional, Any, Self
+
+sys.dont_write_bytecode = True
+from sci.base.timing import percentile
+
+# resource is only available under UNIX-like OSs
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# peak resident set size of this process in bytes
+def peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, but bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# wrap methods of classes to record their wall time by phase
+# all wrappers are removed when exiting
+class Probe:
+    def __init__(self, targets: List[Tuple[type, str, str]]) -> None:
+        for owner, name, phase in targets:
+            assert isinstance(owner, type)
+            assert name in owner.__dict__
+            assert isinstance(phase, str)
+        self.targets = targets
+
+        self.samples: Dict[str, List[float]] = {}
+        self.lock = threading.Lock()
+        self.originals: List[Tuple[type, str, Any]] = []
+
+    def record(self, phase: str, span: float) -> None:
+        with self.lock:
+            self.samples.setdefault(phase, []).append(span)
+
+    # coroutines are timed until they return, including awaits
+    def __wrap(self, method, phase: str):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def _probe_async_wrapper(*args, **kwargs) -> Any:
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    self.record(phase, time.perf_counter() - start)
+            return _probe_async_wrapper
+
+        @functools.wraps(method)
+        def _probe_wrapper(*args, **kwargs) -> Any:
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(phase, time.perf_counter() - start)
+        return _probe_wrapper
+
+    def __enter__(self) -> Self:
+        for owner, name, phase in self.targets:
+            original = owner.__dict__[name]
+            self.originals.append((owner, name, original))
+            setattr(owner, name, self.__wrap(original, phase))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals.clear()
+
+    def count(self, phase: str) -> int:
+        return len(self.samples.get(phase, []))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                phase: {
+                    "count": len(samples),
+                    "total": sum(samples),
+                    "p50": percentile(samples, 0.5),
+                    "p95": percentile(samples, 0.95),
+                    "p99": percentile(samples, 0.99),
+                    "max": max(samples)
+                } for phase, samples in self.samples.items()
+            }
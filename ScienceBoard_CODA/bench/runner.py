@@ -0,0 +1,318 @@
+import sys
+import os
+import json
+import time
+import tempfile
+
+from contextlib import ExitStack
+from dataclasses import asdict
+from typing import Optional, List, Tuple, Dict, Any
+
+sys.dont_write_bytecode = True
+from sci import TypeSort, OBS
+from sci import Model, Agent, AllInOne, AIOAgent
+from sci import SeeAct, PlannerAgent, GrounderAgent
+from sci import CodeLike, Log, Manager, Task, VManager
+from sci import Automata, Tester, ImagePolicy, ResponseCache
+from sci.base.model import ENCODING_CACHE
+
+from . import simulator
+from .server import StubServer
+from .probe import Probe, peak_rss
+
+
+# drive Tester end to end with simulated VMs and a stub model
+# nothing but the VM and the model server is replaced
+class Bench:
+    TYPE = "Simulator"
+
+    def __init__(
+        self,
+        tasks: int = 16,
+        steps: int = 5,
+        vms: int = 1,
+        standby: bool = False,
+        asynchronous: bool = False,
+        community: str = "aio",
+        pipeline: bool = False,
+        obs_types: List[str] = [OBS.screenshot],
+        screen_size: Tuple[int, int] = (1280, 800),
+        a11y_nodes: int = 200,
+        model_latency: float = 0.5,
+        replicas: int = 1,
+        stream: bool = False,
+        vm_latency: Optional[Dict[str, float]] = None,
+        failure: float = 0.0,
+        action_interval: float = 0,
+        budget: Optional[float] = None,
+        image_policy: Optional[Dict[str, Any]] = None,
+        cache_path: Optional[str] = None,
+        cache_mode: str = "record",
+        impure_ratio: float = 0.5,
+        context_window: int = 15,
+        context_images: Optional[int] = None,
+        history_style: str = "drop",
+        history_images: Optional[int] = None,
+        logs_path: Optional[str] = None
+    ) -> None:
+        assert isinstance(tasks, int) and tasks > 0
+        self.tasks = tasks
+
+        assert isinstance(steps, int) and steps > 0
+        self.steps = steps
+
+        assert isinstance(vms, int) and vms > 0
+        self.vms = vms
+
+        assert isinstance(standby, bool)
+        self.standby = standby
+
+        assert isinstance(asynchronous, bool)
+        self.asynchronous = asynchronous
+
+        # SeeAct requests the model twice a step
+        assert community in ("aio", "seeact")
+        self.community = community
+
+        assert isinstance(pipeline, bool)
+        self.pipeline = pipeline
+
+        for obs_type in obs_types:
+            assert obs_type in (OBS.screenshot, OBS.a11y_tree, OBS.set_of_marks)
+        self.obs_types = set(obs_types)
+
+        self.screen_size = tuple(screen_size)
+        self.a11y_nodes = a11y_nodes
+        self.model_latency = model_latency
+
+        assert isinstance(replicas, int) and replicas > 0
+        self.replicas = replicas
+
+        assert isinstance(stream, bool)
+        self.stream = stream
+
+        self.vm_latency = vm_latency
+        self.failure = failure
+        self.action_interval = action_interval
+        self.budget = budget
+        self.image_policy = ImagePolicy(**(image_policy or {}))
+        # replay recorded responses instead of the stub server if set
+        self.cache = None if cache_path is None \
+            else ResponseCache(cache_path, mode=cache_mode)
+
+        assert 0 <= impure_ratio <= 1
+        self.impure_ratio = impure_ratio
+
+        self.context_window = context_window
+        self.context_images = context_images
+        self.history_style = history_style
+        self.history_images = history_images
+        self.logs_path = logs_path
+
+    # tasks with init items cannot skip reverting snapshot
+    def synthesize(self, tasks_path: str) -> None:
+        impure_count = round(self.tasks * self.impure_ratio)
+        for index in range(self.tasks):
+            initialize = [{
+                "func": "execute",
+                "command": ["true"]
+            }] if index < impure_count else []
+
+            config_path = os.path.join(tasks_path, f"sim_{index:04d}.json")
+            with open(config_path, mode="w", encoding="utf-8") as writable:
+                json.dump({
+                    "type": Bench.TYPE,
+                    "sort": TypeSort.Sort.VM.name,
+                    "steps": self.steps,
+                    "instruction": f"Click through synthetic window #{index}.",
+                    "version": "0.1",
+                    "initialize": initialize,
+                    "evaluate": [{"type": "stop", "value": "TIMEOUT"}]
+                }, writable, indent=2)
+
+    def handle_managers(self, vm_headless: bool, vm_path: str) -> Dict:
+        return {
+            TypeSort.VM: lambda: {
+                "version": "0.1",
+                "vm_path": vm_path,
+                "headless": vm_headless,
+                "screen_size": self.screen_size,
+                "a11y_nodes": self.a11y_nodes,
+                "latency": self.vm_latency,
+                "failure": self.failure
+            }
+        }
+
+    def handle_modules(self) -> Dict[str, Any]:
+        return {Bench.TYPE: simulator}
+
+    @property
+    def targets(self) -> List[Tuple[type, str, str]]:
+        return [
+            (Task, "__call__", "task"),
+            (Task, "acall", "task"),
+            (Task, "init", "init"),
+            (Task, "_step", "step"),
+            (Task, "_astep", "step"),
+            (VManager, "screenshot", "screenshot"),
+            (VManager, "a11y_tree", "a11y_tree"),
+            (VManager, "set_of_marks", "set_of_marks"),
+            (Agent, "dump_fragments", "payload"),
+            (Model, "__call__", "model"),
+            (Model, "acall", "model"),
+            (CodeLike, "__call__", "action"),
+            (Log, "save", "log"),
+            (simulator.VMTask, "eval", "eval")
+        ]
+
+    def __call__(self) -> Dict[str, Any]:
+        shutdown_interval = Tester.SHUTDOWN_INTERVAL
+        action_interval = Manager.ACTION_INTERVAL
+        Tester.SHUTDOWN_INTERVAL = 0
+        Manager.ACTION_INTERVAL = self.action_interval
+
+        temp_dir = tempfile.TemporaryDirectory()
+        tasks_path = os.path.join(temp_dir.name, "tasks")
+        logs_path = self.logs_path or os.path.join(temp_dir.name, "logs")
+        os.makedirs(tasks_path)
+        self.synthesize(tasks_path)
+        ENCODING_CACHE.clear()
+
+        try:
+            with ExitStack() as stack:
+                # replicas are balanced by Model if more than one
+                servers = [
+                    stack.enter_context(StubServer(latency=self.model_latency))
+                    for _ in range(self.replicas)
+                ]
+                base_urls = [server.base_url for server in servers]
+                automata = Automata(
+                    model_style="openai",
+                    base_url=base_urls[0] if self.replicas == 1 else base_urls,
+                    model_name="stub",
+                    context_window=self.context_window,
+                    context_images=self.context_images,
+                    history_style=self.history_style,
+                    history_images=self.history_images,
+                    image_policy=self.image_policy,
+                    cache=self.cache,
+                    stream=self.stream
+                )
+                community = AllInOne(automata(AIOAgent)) if self.community == "aio" \
+                    else SeeAct(
+                        planner=automata(PlannerAgent),
+                        grounder=automata(GrounderAgent),
+                        pipeline=self.pipeline
+                    )
+
+                tester = Tester(
+                    tasks_path=tasks_path,
+                    logs_path=logs_path,
+                    community=community,
+                    obs_types=self.obs_types,
+                    vm_path=[f"simulator-{index}" for index in range(self.vms)],
+                    headless=True,
+                    ignore=False,
+                    standby=self.standby,
+                    asynchronous=self.asynchronous,
+                    budget=self.budget,
+                    handle_managers=self.handle_managers,
+                    handle_modules=self.handle_modules
+                )
+
+                with Probe(self.targets) as probe:
+                    start = time.perf_counter()
+                    tester()
+                    wall = time.perf_counter() - start
+                totals = tester.journal.totals()
+                requests = [server.requests for server in servers]
+                received = sum(server.received for server in servers)
+                connections = sum(server.connections for server in servers)
+                aborted = sum(server.aborted for server in servers)
+        finally:
+            Tester.SHUTDOWN_INTERVAL = shutdown_interval
+            Manager.ACTION_INTERVAL = action_interval
+            temp_dir.cleanup()
+
+        steps = probe.count("step")
+        return {
+            "config": {
+                "tasks": self.tasks,
+                "steps": self.steps,
+                "vms": self.vms,
+                "standby": self.standby,
+                "asynchronous": self.asynchronous,
+                "community": self.community,
+                "pipeline": self.pipeline,
+                "obs_types": sorted(self.obs_types),
+                "screen_size": list(self.screen_size),
+                "model_latency": self.model_latency,
+                "replicas": self.replicas,
+                "stream": self.stream,
+                "vm_latency": simulator.LATENCY | (self.vm_latency or {}),
+                "failure": self.failure,
+                "budget": self.budget,
+                "image_policy": asdict(self.image_policy),
+                "context_window": self.context_window,
+                "context_images": self.context_images,
+                "history_style": self.history_style,
+                "history_images": self.history_images,
+                "cache_mode": None if self.cache is None else self.cache.mode
+            },
+            "wall": wall,
+            "steps": steps,
+            "steps_per_sec": steps / wall,
+            "tasks_per_min": probe.count("task") * 60 / wall,
+            "outcomes": totals,
+            "requests": sum(requests),
+            "replica_requests": requests,
+            "request_bytes": received,
+            "connections": connections,
+            "aborted": aborted,
+            "cache": None if self.cache is None else {
+                "hits": self.cache.hits,
+                "misses": self.cache.misses
+            },
+            "encodings": {
+                "hits": ENCODING_CACHE.hits,
+                "misses": ENCODING_CACHE.misses
+            },
+            "peak_rss": peak_rss(),
+            "phases": probe.summary()
+        }
+
+    @staticmethod
+    def format(report: Dict[str, Any]) -> str:
+        lines = [
+            f"config: {json.dumps(report['config'])}",
+            f"outcomes: {json.dumps(report['outcomes'])}",
+            f"wall time: {report['wall']:.3f}s",
+            f"throughput: {report['steps']} steps, "
+                f"{report['steps_per_sec']:.3f} steps/s, "
+                f"{report['tasks_per_min']:.3f} tasks/min",
+            f"model requests: {report['requests']}, "
+                f"{report['request_bytes'] / max(report['requests'], 1) / 1024:.1f} KiB/request, "
+                f"{report['connections']} connections, "
+                f"{report['replica_requests']} by replica, "
+                f"{report['aborted']} streams cut off",
+            f"image encodings: {report['encodings']['hits']} hits, "
+                f"{report['encodings']['misses']} misses",
+            "response cache: " + (
+                "off" if report["cache"] is None
+                else f"{report['cache']['hits']} hits, {report['cache']['misses']} misses"
+            ),
+            "peak RSS: " + (
+                "unknown" if report["peak_rss"] is None
+                else f"{report['peak_rss'] / 1024 / 1024:.1f} MiB"
+            ),
+            f"{'phase':<14}{'count':>8}{'p50/ms':>10}{'p95/ms':>10}{'p99/ms':>10}{'max/ms':>10}"
+        ]
+        for phase, stat in report["phases"].items():
+            lines.append(
+                f"{phase:<14}{stat['count']:>8}"
+                + "".join([
+                    f"{stat[key] * 1000:>10.1f}"
+                    for key in ("p50", "p95", "p99", "max")
+                ])
+            )
+        return "\n".join(lines)
@@ -0,0 +1,178 @@
+import sys
+import re
+import json
+import time
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Self
+
+sys.dont_write_bytecode = True
+
+
+# OpenAI-compatible stand-in of model servers
+# - answers POST /v1/chat/completions after `latency` seconds
+#   and GET /v1/models at once for health checks
+# - always replies one pyautogui action in antiquot style
+#   so that tasks run until their step limit
+# - connections are kept alive as real servers do
+# - requests with "stream" are answered in server-sent events
+#   word by word, `latency` being spread over the whole reply
+#   which goes on rambling after the action, as models often do
+class StubServer:
+    PATHNAME = "/v1/chat/completions"
+    MODELS = "/v1/models"
+    ACTION = "pyautogui.click({x}, {y})"
+    RAMBLE = " ".join(["After clicking, the item should be opened in a new window."] * 4)
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ) -> None:
+        assert isinstance(latency, (int, float)) and latency >= 0
+        self.latency = latency
+
+        self.requests = 0
+        self.received = 0
+        self.connections = 0
+        # streams closed by clients before their end
+        self.aborted = 0
+        self.lock = threading.Lock()
+
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_GET(self) -> None:
+                stub._models(self)
+
+            def do_POST(self) -> None:
+                stub._handle(self)
+
+            def log_message(self, *args) -> None:
+                ...
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{StubServer.PATHNAME}"
+
+    def _models(self, handler: BaseHTTPRequestHandler) -> None:
+        if handler.path != StubServer.MODELS:
+            handler.send_error(404)
+            return
+
+        response = json.dumps({
+            "object": "list",
+            "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]
+        }).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(response)))
+        handler.end_headers()
+        handler.wfile.write(response)
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        length = int(handler.headers.get("Content-Length", 0))
+        body = handler.rfile.read(length)
+        if handler.path != StubServer.PATHNAME:
+            handler.send_error(404)
+            return
+
+        payload = json.loads(body)
+        with self.lock:
+            self.requests += 1
+            self.received += length
+            index = self.requests
+
+        action = StubServer.ACTION.format(x=index % 1280, y=index % 800)
+        content = f"Click on the item.\n```\n{action}\n```\n{StubServer.RAMBLE}"
+        if payload.get("stream", False):
+            return self._stream(handler, index, content)
+
+        time.sleep(self.latency)
+        response = json.dumps({
+            "id": f"stub-{index}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": length // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (length + len(content)) // 4
+            }
+        }).encode("utf-8")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(response)))
+        handler.end_headers()
+        handler.wfile.write(response)
+
+    def _stream(
+        self,
+        handler: BaseHTTPRequestHandler,
+        index: int,
+        content: str
+    ) -> None:
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(data: str) -> None:
+            event = f"data: {data}\n\n".encode("utf-8")
+            handler.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            handler.wfile.flush()
+
+        words = re.findall(r"\S+\s*|\s+", content)
+        try:
+            for order, word in enumerate(words):
+                time.sleep(self.latency / len(words))
+                send(json.dumps({
+                    "id": f"stub-{index}",
+                    "object": "chat.completion.chunk",
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": word} if order == 0
+                            else {"content": word},
+                        "finish_reason": "stop" if order == len(words) - 1 else None
+                    }]
+                }))
+            send("[DONE]")
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.lock:
+                self.aborted += 1
+            handler.close_connection = True
+
+    def __enter__(self) -> Self:
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name="StubServer",
+            daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
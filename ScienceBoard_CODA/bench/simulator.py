@@ -0,0 +1,226 @@
+import sys
+import json
+import time
+import random
+import threading
+import requests
+
+from io import BytesIO
+from typing import Optional, Tuple, Dict, Any, Callable
+from PIL import Image, ImageDraw
+
+sys.dont_write_bytecode = True
+from sci.base import Task
+from sci.vm import VManager, VTask
+from sci.vm.vmanager import VirtualEnv
+from sci.vm import utils
+
+# simulated latency of VM side in seconds
+LATENCY = {
+    "screenshot": 0.05,
+    "a11y_tree": 0.1,
+    "terminal": 0.01,
+    "action": 0.05,
+    "revert": 0.5,
+    "request": 0.02
+}
+
+
+class SimulatedResponse:
+    def __init__(self, status_code: int = 200, text: str = "OK") -> None:
+        self.status_code = status_code
+        self.text = text
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+# stand-in of OSWorld's PythonController
+# frames are rendered once and cycled, so that
+# host-side costs are measured instead of the renderer
+class SimulatedController:
+    FRAMES = 8
+
+    def __init__(
+        self,
+        screen_size: Tuple[int, int],
+        a11y_nodes: int,
+        latency: Dict[str, float],
+        failure: float = 0.0,
+        seed: int = 0
+    ) -> None:
+        self.vm_ip = "127.0.0.1"
+        self.latency = latency
+        self.failure = failure
+        self.random = random.Random(seed)
+        self.frames = [self.__render(screen_size) for _ in range(self.FRAMES)]
+        self.a11y_tree = self.__a11y_tree(screen_size, a11y_nodes)
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def __render(self, screen_size: Tuple[int, int]) -> bytes:
+        width, height = screen_size
+        image = Image.new("RGB", screen_size, (236, 236, 236))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, width, 28], fill=(48, 48, 48))
+        for _ in range(40):
+            left = self.random.randrange(0, width - 40)
+            top = self.random.randrange(28, height - 20)
+            color = tuple(self.random.randrange(0, 256) for _ in range(3))
+            draw.rectangle([
+                left,
+                top,
+                left + self.random.randrange(20, 240),
+                top + self.random.randrange(12, 120)
+            ], fill=color)
+            draw.text((left + 4, top + 2), f"item {left}-{top}", fill=(0, 0, 0))
+
+        writable = BytesIO()
+        image.save(writable, format="PNG")
+        return writable.getvalue()
+
+    def __a11y_tree(self, screen_size: Tuple[int, int], a11y_nodes: int) -> str:
+        width, height = screen_size
+        state, component = utils.state_ns_ubuntu, utils.component_ns_ubuntu
+        nodes = []
+        for index in range(a11y_nodes):
+            tag = ("push-button", "label", "text", "menu-item")[index % 4]
+            coord = (self.random.randrange(0, width), self.random.randrange(0, height))
+            nodes.append(
+                f'<{tag} name="node {index}" '
+                f'st:showing="true" st:visible="true" st:enabled="true" '
+                f'cp:screencoord="{coord}" cp:size="(64, 24)">'
+                f'text {index}</{tag}>'
+            )
+        return (
+            f'<desktop-frame xmlns:st="{state}" xmlns:cp="{component}">'
+            + "".join(nodes)
+            + "</desktop-frame>"
+        )
+
+    def get_screenshot(self) -> bytes:
+        time.sleep(self.latency["screenshot"])
+        with self.lock:
+            self.cursor = (self.cursor + 1) % len(self.frames)
+            return self.frames[self.cursor]
+
+    def get_accessibility_tree(self) -> str:
+        time.sleep(self.latency["a11y_tree"])
+        return self.a11y_tree
+
+    def get_terminal_output(self) -> str:
+        time.sleep(self.latency["terminal"])
+        return "user@ubuntu:~$ "
+
+    # transient failures are injected into actions
+    def execute_python_command(self, code: str) -> Dict[str, Any]:
+        time.sleep(self.latency["action"])
+        if random.random() < self.failure:
+            raise requests.ConnectionError("Simulated failure of VM.")
+        return {"status": "success", "output": "", "error": ""}
+
+    def start_recording(self) -> None:
+        ...
+
+    def end_recording(self, dest_path: str) -> None:
+        ...
+
+
+# stand-in of OSWorld's DesktopEnv
+class SimulatedEnv:
+    def __init__(self, value: VirtualEnv, **kwargs) -> None:
+        self.snapshot_name = value["snapshot_name"]
+        self.controller = SimulatedController(**kwargs)
+
+    def _revert_to_snapshot(self) -> None:
+        time.sleep(self.controller.latency["revert"])
+
+    def _start_emulator(self) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+# VManager without vmware / vmrun / desktop_env
+# everything above DesktopEnv is kept as it is
+class VMManager(VManager):
+    def __init__(
+        self,
+        version: str = "0.1",
+        vm_path: Optional[str] = None,
+        headless: bool = True,
+        a11y_tree_limit: int = 10240,
+        screen_size: Tuple[int, int] = (1280, 800),
+        a11y_nodes: int = 200,
+        latency: Optional[Dict[str, float]] = None,
+        failure: float = 0.0,
+        **kwargs
+    ) -> None:
+        # skip VManager.__init__() which checks vm files
+        super(VManager, self).__init__(version)
+
+        assert isinstance(vm_path, str)
+        self.path = vm_path
+
+        assert isinstance(headless, bool)
+        self.headless = headless
+
+        assert isinstance(a11y_tree_limit, int)
+        self.a11y_tree_limit = a11y_tree_limit
+
+        assert len(screen_size) == 2
+        self.screen_size = tuple(screen_size)
+
+        assert isinstance(a11y_nodes, int)
+        self.a11y_nodes = a11y_nodes
+
+        self.latency = LATENCY.copy()
+        if latency is not None:
+            for key, value in latency.items():
+                assert key in LATENCY
+                self.latency[key] = float(value)
+
+        assert 0 <= failure < 1
+        self.failure = failure
+
+        self.env = VirtualEnv(
+            provider_name="simulator",
+            path_to_vm=self.path,
+            snapshot_name=VManager.INIT_NAME,
+            action_space="pyautogui",
+            headless=self.headless
+        )
+
+    def _spawn(self, value: VirtualEnv) -> Callable[[], SimulatedEnv]:
+        kwargs = {
+            "screen_size": self.screen_size,
+            "a11y_nodes": self.a11y_nodes,
+            "latency": self.latency,
+            "failure": self.failure
+        }
+        return lambda: SimulatedEnv(value, **kwargs)
+
+    def _request(self, query: str, param: Dict[str, Any]) -> SimulatedResponse:
+        time.sleep(self.latency["request"])
+        return SimulatedResponse()
+
+
+class VMTask(VTask):
+    def __init__(
+        self,
+        config_path: str,
+        manager: VMManager,
+        *args,
+        **kwargs
+    ) -> None:
+        # to enable Pylance type checker
+        assert isinstance(manager, VMManager)
+        self.manager = manager
+
+        super().__init__(config_path, manager, *args, **kwargs)
+
+    # only stop types are evaluated
+    @Task._stop_handler
+    def eval(self) -> bool:
+        return True
@@ -4,7 +4,14 @@ import os
 sys.dont_write_bytecode = True
 sys.stdout.reconfigure(encoding="utf-8")
 from sci import Automata, Tester, OBS
-from sci import AllInOne, AIOAgent
+from sci import AllInOne, AIOAgent, ResponseCache
+
+# record / replay responses under MODEL_CACHE if set
+# MODEL_CACHE_MODE: passthrough, record (default) or replay
+MODEL_CACHE = None if "MODEL_CACHE" not in os.environ else ResponseCache(
+    os.environ["MODEL_CACHE"],
+    mode=os.environ.get("MODEL_CACHE_MODE", "record")
+)
 
 # open-source models
 qwen25_vl = lambda cls: Automata(
@@ -14,6 +21,16 @@ qwen25_vl = lambda cls: Automata(
     overflow_style="openai_lmdeploy",
     hide_text=True,
     temperature=1.,
+    cache=MODEL_CACHE,
+    # stop generation once an action is complete if MODEL_STREAM=1
+    stream=os.environ.get("MODEL_STREAM", "0") == "1",
+    # shorten context in advance if CONTEXT_LIMIT (tokens) is set
+    estimate_style="qwen",
+    context_limit=int(os.environ["CONTEXT_LIMIT"]) if "CONTEXT_LIMIT" in os.environ else None,
+    # full screenshots in the last CONTEXT_IMAGES turns, HISTORY_STYLE for older ones
+    context_images=int(os.environ["CONTEXT_IMAGES"]) if "CONTEXT_IMAGES" in os.environ else None,
+    history_style=os.environ.get("HISTORY_STYLE", "drop"),
+    history_images=int(os.environ["HISTORY_IMAGES"]) if "HISTORY_IMAGES" in os.environ else None
 )(cls)
 
 if __name__ == "__main__":
@@ -28,6 +45,13 @@ if __name__ == "__main__":
         # tasks_path=f'tasks/VM_ANS/',
         logs_path=f"./logs/{os.environ['SUBFOLDER']}",
         community=AIO_GROUP,
-        vm_path=os.environ["VM_PATH"],
-        headless=True
+        # comma-separated VM_PATH spawns one worker per VM
+        vm_path=os.environ["VM_PATH"].split(","),
+        headless=True,
+        # pair VMs to prepare the next task on a standby VM
+        standby=os.environ.get("STANDBY", "0") == "1",
+        # run workers as coroutines of one thread; requires httpx
+        asynchronous=os.environ.get("ASYNCHRONOUS", "0") == "1",
+        # seconds of wall-clock per task, beyond which it stops as TIMEOUT
+        budget=float(os.environ["TASK_BUDGET"]) if "TASK_BUDGET" in os.environ else None
     )()
\ No newline at end of file
@@ -110,14 +110,21 @@ class RawTask(Task, TaskMixin):
         self.initial = REPLOutput.from_sorry(output.sorries[0])
         return True
 
-    def __call__(self) -> bool:
+    def __headers(self) -> None:
         # LONG LIVE THE CLOSURE!!
         self.manager.set_headers(lambda _: filter(
             lambda item: item is not None,
             [self.header, self.origin]
         ))
+
+    def __call__(self) -> bool:
+        self.__headers()
         return super().__call__()
 
+    async def acall(self) -> bool:
+        self.__headers()
+        return await super().acall()
+
     @Task._stop_handler
     def eval(self) -> bool:
         return any([item.is_success() for item in self.manager.history])
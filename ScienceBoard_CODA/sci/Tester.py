@@ -4,21 +4,29 @@ import re
 import copy
 import shutil
 import inspect
+import importlib.util
 import tempfile
 import traceback
 import math
-from dataclasses import dataclass
-
-from typing import Union, Optional, List, Set, Dict, Any
+import time
+import queue
+import asyncio
+import threading
+import multiprocessing
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from typing import Union, Optional, List, Tuple, Set, Dict, Any
 from typing import Iterable, Callable, Generator, FrozenSet
-from typing import TypeVar, TypedDict, Unpack, NotRequired
+from typing import TypeVar, TypedDict, Unpack, NotRequired, Self
 
 sys.dont_write_bytecode = True
 from . import TypeSort
-from . import Model, ModelType
+from . import Model, ModelType, ImagePolicy, ResponseCache, Retry
 from . import Agent, AIOAgent, Community
-from . import Manager, VManager, Task
-from . import Log, VirtualLog
+from . import Manager, VManager, Task, Manifest, Journal
+from . import Log, VirtualLog, Timing, Primitive
 from . import OBS, Presets
 
 POLY = TypeVar("POLY")
@@ -29,7 +37,9 @@ class Counter:
     failed: int = 0
     skipped: int = 0
     ignored: int = 0
-    vlog: VirtualLog = VirtualLog()
+    retried: int = 0
+    vlog: VirtualLog = field(default_factory=VirtualLog)
+    timings: Dict[str, List[float]] = field(default_factory=dict)
 
     def _pass(self) -> None:
         self.passed += 1
@@ -43,10 +53,48 @@ class Counter:
         self.skipped += 1
         self.vlog.error("Task testing failed; skipped.\n" + traceback.format_exc())
 
-    def _ignore(self) -> None:
+    # overrun tasks are failed instead of skipped
+    def _timeout(self, budget: float) -> None:
+        self.failed += 1
+        self.vlog.error(
+            f"Task exceeded its budget of {budget}s; "
+            "finished with passed=FALSE as TIMEOUT.\n"
+            + traceback.format_exc()
+        )
+
+    # retried attempts are not counted in total
+    def _retry(self, kind: str, attempt: int, delay: float) -> None:
+        self.retried += 1
+        self.vlog.warning(
+            f"Task testing failed due to {kind}; "
+            f"requeued as attempt {attempt} after {delay}s.\n"
+            + traceback.format_exc()
+        )
+
+    # log file exists only if the task is ignored inside of log
+    def _ignore(self, ident: Optional[str] = None) -> None:
         self.ignored += 1
-        self.vlog.info("Task already finished; ignored.")
-        self.vlog.register(Log.delete)
+        if ident is None:
+            self.vlog.info("Task already finished; ignored.")
+            self.vlog.register(Log.delete)
+        else:
+            self.vlog.info(f"Task {ident} already finished; ignored.")
+
+    # collect timing of a task before its log ends
+    def _time(self, timing: Timing) -> None:
+        for phase, spans in timing.samples().items():
+            self.timings.setdefault(phase, []).extend(spans)
+
+    # merge counters of workers into the one of tester
+    def __iadd__(self, __value: "Counter") -> Self:
+        self.passed += __value.passed
+        self.failed += __value.failed
+        self.skipped += __value.skipped
+        self.ignored += __value.ignored
+        self.retried += __value.retried
+        for phase, spans in __value.timings.items():
+            self.timings.setdefault(phase, []).extend(spans)
+        return self
 
     def __str__(self) -> str:
         total = self.passed + self.failed + self.skipped + self.ignored
@@ -55,20 +103,37 @@ class Counter:
             f"{self.passed} passed, "
             f"{self.failed} failed, "
             f"{self.skipped} skipped, "
-            f"{self.ignored} ignored."
+            f"{self.ignored} ignored"
+            + (f"; {self.retried} retried." if self.retried > 0 else ".")
         )
 
     def __repr__(self) -> str:
         return "\033[1m" + self.__str__() + "\033[0m"
 
+    # vlog is left out to pass counter between processes
+    def _asdict(self) -> Dict[str, Any]:
+        return {
+            "passed": self.passed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "ignored": self.ignored,
+            "retried": self.retried,
+            "timings": self.timings
+        }
+
     def callback(self) -> None:
         self.vlog.info(self.__repr__())
+        if len(self.timings) > 0:
+            self.vlog.info(
+                "Timing of all tasks:\n"
+                + Timing.format(Timing.summary(self.timings))
+            )
 
 
 # type annotation for Automata
 class AutomataType(TypedDict):
     model_style: ModelType
-    base_url: str
+    base_url: Union[str, List[str]]
     model_name: str
     api_key: NotRequired[Optional[str]]
     proxy: NotRequired[Optional[str]]
@@ -76,10 +141,22 @@ class AutomataType(TypedDict):
     max_tokens: NotRequired[Optional[int]]
     top_p: NotRequired[Optional[float]]
     temperature: NotRequired[Optional[float]]
+    pool_size: NotRequired[int]
+    stream: NotRequired[bool]
+    image_policy: NotRequired[ImagePolicy]
+    cache: NotRequired[Optional[ResponseCache]]
+    retry: NotRequired[Retry]
     overflow_style: NotRequired[Optional[str]]
     context_window: NotRequired[int]
     hide_text: NotRequired[bool]
     code_style: NotRequired[str]
+    estimate_style: NotRequired[Optional[str]]
+    context_limit: NotRequired[Optional[int]]
+    context_capacity: NotRequired[Optional[int]]
+    context_memory: NotRequired[Optional[int]]
+    context_images: NotRequired[Optional[int]]
+    history_style: NotRequired[str]
+    history_images: NotRequired[Optional[int]]
 
 
 # Automata receive keyword args from Model and Agent
@@ -161,10 +238,19 @@ class TaskInfo:
             identifier.replace("\\", "/")
         return identifier
 
+    # tasks sharing (sort, app, snapshot, init funcs) are scheduled
+    # next to each other, so that VTask may skip reverting snapshot
+    @property
+    def affinity(self) -> Tuple[str, str, str, Tuple[str, ...]]:
+        return (
+            self.task.sort,
+            self.task.type,
+            getattr(self.task, "snapshot", ""),
+            tuple(init_item["func"] for init_item in self.task.initialize)
+        )
+
     def __lt__(self, __value: "TaskInfo") -> bool:
-        left, right = self.task, __value.task
-        return left.sort < right.sort or \
-            (left.sort == right.sort and left.type < right.type)
+        return self.affinity < __value.affinity
 
     def __repr__(self) -> str:
         return f"{self.ident}: {self.task.sort}.{self.task.type}"
@@ -172,15 +258,16 @@ class TaskInfo:
     def __call__(self) -> bool:
         return self.task()
 
+    async def acall(self) -> bool:
+        return await self.task.acall()
+
     # return True if the task has not been finished
-    def snoop(self, base_path: str) -> bool:
-        return not os.path.exists(os.path.join(
-            base_path,
-            self.ident,
-            Log.RESULT_FILENAME
-        ))
+    def snoop(self, journal: Journal) -> bool:
+        return not journal.finished(self.ident)
 
 
+# raw should be sorted by TaskInfo.affinity
+# one group per manager; inside of a group, tasks of same snapshot are adjacent
 class TaskGroup:
     def __init__(self, raw: List[TaskInfo]) -> None:
         assert isinstance(raw, list)
@@ -206,13 +293,13 @@ class TaskGroup:
                     assert VManager in first.__class__.mro() \
                         and VManager in current.__class__.mro()
 
-    def __call__(self, base_path: str, ignore: bool) -> Generator:
-        assert isinstance(base_path, str)
+    def __call__(self, journal: Journal, ignore: bool) -> Generator:
+        assert isinstance(journal, Journal)
         assert isinstance(ignore, bool)
         self.__check()
 
         for group in self.groups:
-            has_unfinished = any([item.snoop(base_path) for item in group])
+            has_unfinished = any([item.snoop(journal) for item in group])
             if has_unfinished or not ignore:
                 with group[0].task.manager:
                     for task_info in group:
@@ -222,6 +309,457 @@ class TaskGroup:
                     yield task_info
 
 
+# shared work queue of all workers
+# a worker prefers tasks sharing its last affinity, then its last type_sort
+# so that its snapshot and managers need not to be switched
+# skipped tasks of transient failures are requeued
+# - with a renewed Task, as eval() consumes evaluate items
+# - after exponential backoff, and only when no fresh task is left
+# - preferably on another worker: the failed one waits one more backoff
+#   unless no other worker pulling from the pool can take the task
+class TaskPool:
+    BACKOFF = 30
+
+    def __init__(
+        self,
+        raw: List[TaskInfo],
+        renew: Optional[Callable[[TaskInfo], TaskInfo]] = None,
+        attempts: int = 1
+    ) -> None:
+        assert isinstance(raw, list)
+        for task_info in raw:
+            assert isinstance(task_info, TaskInfo)
+        self.pending = raw.copy()
+        self.lock = threading.Condition()
+
+        assert renew is None or hasattr(renew, "__call__")
+        self.renew = renew
+
+        assert isinstance(attempts, int) and attempts > 0
+        self.attempts = attempts
+
+        # (ready time, failed worker, task info)
+        self.delayed: List[Tuple[float, Optional[int], TaskInfo]] = []
+        self.tried: Dict[str, int] = {}
+        # whether workers still pulling are primary, by index
+        self.pulling: Dict[int, bool] = {}
+
+    def __len__(self) -> int:
+        return len(self.pending) + len(self.delayed)
+
+    # kind of failure if it is worth retrying, or None
+    @staticmethod
+    def classify(error: Exception) -> Optional[str]:
+        if isinstance(error, (
+            requests.RequestException,
+            ConnectionError,
+            TimeoutError
+        )):
+            return "network"
+        # outages of models, while deadlines are left to TIMEOUT
+        if isinstance(error, Retry.Exhausted) and not error.overdue:
+            return "model"
+        if isinstance(error, AssertionError) \
+            and str(error) == Task.INIT_FAILURE:
+            return "initialization"
+        return None
+
+    # return (kind, attempt, delay) if requeued
+    def requeue(
+        self,
+        task_info: TaskInfo,
+        error: Exception,
+        index: Optional[int] = None
+    ) -> Optional[Tuple[str, int, float]]:
+        kind = TaskPool.classify(error)
+        attempt = self.tried.get(task_info.ident, 1) + 1
+        if self.renew is None or kind is None or attempt > self.attempts:
+            return None
+
+        renewed = self.renew(task_info)
+        delay = TaskPool.BACKOFF * 2 ** (attempt - 2)
+        with self.lock:
+            self.tried[task_info.ident] = attempt
+            self.delayed.append((time.time() + delay, index, renewed))
+            self.lock.notify_all()
+        return kind, attempt, delay
+
+    # raw tasks are bound to the primary worker
+    # because raw managers of all workers share the same host
+    def pull(
+        self,
+        primary: bool,
+        last: Optional[TaskInfo] = None,
+        index: Optional[int] = None
+    ) -> Optional[TaskInfo]:
+        available = lambda task_info, primary=primary: primary \
+            or task_info.task.type_sort.sort == TypeSort.Sort.VM
+        # another worker may take the task instead of the failed one
+        handover = lambda failed, task_info: failed == index and any(
+            available(task_info, other_primary)
+            for other, other_primary in self.pulling.items()
+            if other != index
+        )
+
+        with self.lock:
+            if index is not None:
+                self.pulling[index] = primary
+            while True:
+                candidates = [
+                    order for order, task_info in enumerate(self.pending)
+                    if available(task_info)
+                ]
+                if len(candidates) > 0:
+                    break
+
+                # wait for the earliest retry this worker can take
+                ready_times = [
+                    (ready + (TaskPool.BACKOFF if handover(failed, task_info) else 0), order)
+                    for order, (ready, failed, task_info) in enumerate(self.delayed)
+                    if available(task_info)
+                ]
+                if len(ready_times) == 0:
+                    self.pulling.pop(index, None)
+                    # others may no longer wait for this one
+                    self.lock.notify_all()
+                    return None
+
+                now = time.time()
+                ready, order = min(ready_times)
+                if ready <= now:
+                    return self.delayed.pop(order)[2]
+                self.lock.wait(timeout=ready - now)
+
+            if last is not None:
+                for similar in (
+                    lambda task_info: task_info.affinity == last.affinity,
+                    lambda task_info: task_info.task.type_sort == last.task.type_sort
+                ):
+                    for order in candidates:
+                        if similar(self.pending[order]):
+                            return self.pending.pop(order)
+            return self.pending.pop(candidates[0])
+
+
+# each worker owns one VM, together with
+# its own managers, community and log
+class Worker:
+    def __init__(
+        self,
+        index: int,
+        log: Log,
+        community: Community,
+        manager_args: Presets.Config,
+        modules: Dict[str, Any],
+        logs_path: str,
+        journal: Journal,
+        ignore: bool = True,
+        optimize: bool = True,
+        budget: Optional[float] = None,
+        max_steps: Optional[int] = None
+    ) -> None:
+        assert isinstance(index, int)
+        self.index = index
+
+        assert isinstance(log, Log)
+        self.log = log
+
+        assert isinstance(community, Community)
+        self.community = community
+        self.community.vlog.set(self.log)
+        for _, agent in self.community:
+            agent.vlog.set(self.log)
+
+        self.manager_args = manager_args
+        self.managers = {}
+        self.modules = modules
+
+        assert isinstance(logs_path, str)
+        self.logs_path = logs_path
+
+        assert isinstance(journal, Journal)
+        self.journal = journal
+
+        assert isinstance(ignore, bool)
+        self.ignore = ignore
+
+        assert isinstance(optimize, bool)
+        self.optimize = optimize
+
+        # wall-clock budget in seconds & step budget of each task
+        assert budget is None or budget > 0
+        self.budget = budget
+
+        assert max_steps is None or (isinstance(max_steps, int) and max_steps > 0)
+        self.max_steps = max_steps
+
+        # set by Tester in double-buffered mode
+        self.standby: Optional[Worker] = None
+        # skipped tasks are requeued into pool if set
+        self.pool: Optional[TaskPool] = None
+        self.counter = Counter()
+        self.counter.vlog.set(self.log)
+
+    @property
+    def primary(self) -> bool:
+        return self.index == 0
+
+    def manager(self, type_sort: TypeSort) -> Manager:
+        # add __str__() to differentiate all managers
+        if str(type_sort) in self.managers:
+            return self.managers[str(type_sort)]
+
+        manager_class = getattr(
+            self.modules[type_sort.type],
+            type_sort(Manager.__name__)
+        )
+
+        manager_args = self.manager_args[type_sort]()
+        manager = manager_class(**manager_args)
+        self.managers[str(type_sort)] = manager
+        manager.vlog.set(self.log)
+        return manager
+
+    # tasks are loaded with managers of the primary worker
+    # rebind them before running on this worker
+    def bind(self, task_info: TaskInfo) -> Task:
+        task = task_info.task
+        task.manager = self.manager(task.type_sort)
+        task.community = self.community
+        task.vlog.set(self.log)
+        if self.max_steps is not None:
+            task.steps = min(task.steps, self.max_steps)
+        return task
+
+    @staticmethod
+    def release(manager: Optional[Manager]) -> None:
+        if manager is not None and manager.entered:
+            manager.__exit__(None, None, None)
+
+    # stages of running a task are split for double-buffered mode
+    # - open(): start the log of task; None if task is ignored
+    # - stage(): enter manager, and initialize task if `prepare`
+    # - close(): predict and evaluate task, then end the log
+    def open(self, task_info: TaskInfo, counter: Counter) -> Optional[Task]:
+        # finished tasks are decided by journal without touching logs
+        finished = self.journal.finished(task_info.ident)
+        if finished and self.ignore:
+            counter._ignore(task_info.ident)
+            return None
+
+        task = self.bind(task_info)
+        result_exist = self.log(
+            base_path=self.logs_path,
+            ident=task_info.ident,
+            ignore=self.ignore,
+            finished=finished
+        ).__enter__()
+
+        if result_exist:
+            counter._ignore()
+            self.log.__exit__(None, None, None)
+            return None
+
+        # charged from the start of prediction, see Task.predict()
+        self.log.timing.limit(self.budget)
+        return task
+
+    def stage(
+        self,
+        task: Task,
+        current: Optional[Manager],
+        prepare: bool = False
+    ) -> Tuple[Optional[Manager], Optional[Exception]]:
+        try:
+            # enter manager lazily so that finished tasks cost nothing
+            # VM managers of one worker share the same env
+            if self.optimize and not task.manager.entered:
+                Worker.release(current)
+                current = task.manager
+                current.__enter__()
+            if prepare:
+                assert task.prepare(), Task.INIT_FAILURE
+            return current, None
+        except Exception as err:
+            return current, err
+
+    def close(
+        self,
+        task_info: TaskInfo,
+        counter: Counter,
+        started: float,
+        error: Optional[Exception] = None,
+        passed: Optional[bool] = None
+    ) -> None:
+        task, outcome = task_info.task, Journal.SKIP
+        try:
+            # re-raise here to have it counted with traceback
+            if error is not None:
+                raise error
+            # already run by aclose() if passed is given
+            if task_info() if passed is None else passed:
+                outcome = Journal.PASS
+                counter._pass()
+            else:
+                outcome = Journal.FAIL
+                counter._fail()
+        except Exception as err:
+            # VM is in unknown state after failure
+            if isinstance(task.manager, VManager):
+                task.manager.current_snapshot = None
+            # overrun tasks are never evaluated, whichever call raised
+            if isinstance(err, Timing.Overtime) or self.log.timing.overdue:
+                outcome = Journal.FAIL
+                task.stop_type = Primitive.TIMEOUT
+                with open(self.log.result_file_path, mode="w", encoding="utf-8") as writable:
+                    writable.write(str(int(False)))
+                counter._timeout(self.budget)
+            else:
+                requeued = None if self.pool is None \
+                    else self.pool.requeue(task_info, err, self.index)
+                if requeued is None:
+                    counter._skip()
+                else:
+                    counter._retry(*requeued)
+        finally:
+            # calls blocked on a VM are not interrupted but run out
+            # so the VM overran is reverted before the next task
+            if self.log.timing.overdue and isinstance(task.manager, VManager):
+                task.manager.current_snapshot = None
+            self.journal.record(
+                ident=task_info.ident,
+                outcome=outcome,
+                stop_type=getattr(task.stop_type, "__name__", None),
+                steps=task.step_count,
+                started=started
+            )
+            counter._time(self.log.timing)
+            self.log.__exit__(None, None, None)
+
+    def run(
+        self,
+        task_info: TaskInfo,
+        counter: Counter,
+        current: Optional[Manager] = None
+    ) -> Optional[Manager]:
+        if (task := self.open(task_info, counter)) is None:
+            return current
+
+        started = time.time()
+        current, error = self.stage(task, current)
+        self.close(task_info, counter, started, error)
+        return current
+
+    # asynchronous mode: workers are coroutines on one event loop
+    # blocking stages are run in threads; model requests hold none
+    async def aclose(
+        self,
+        task_info: TaskInfo,
+        counter: Counter,
+        started: float,
+        error: Optional[Exception] = None
+    ) -> None:
+        passed = None
+        if error is None:
+            try:
+                passed = await task_info.acall()
+            except Exception as err:
+                error = err
+        self.close(task_info, counter, started, error, passed)
+
+    async def arun(
+        self,
+        task_info: TaskInfo,
+        counter: Counter,
+        current: Optional[Manager] = None
+    ) -> Optional[Manager]:
+        if (task := self.open(task_info, counter)) is None:
+            return current
+
+        started = time.time()
+        current, error = await asyncio.to_thread(self.stage, task, current)
+        await self.aclose(task_info, counter, started, error)
+        return current
+
+    # pull the next unfinished task and prepare it on this worker
+    def pull(
+        self,
+        pool: TaskPool,
+        current: Optional[Manager],
+        last: Optional[TaskInfo] = None
+    ) -> Tuple[Optional[Tuple[TaskInfo, float, Optional[Exception]]], Optional[Manager]]:
+        while (task_info := pool.pull(self.primary, last, self.index)) is not None:
+            last = task_info
+            if (task := self.open(task_info, self.counter)) is None:
+                continue
+
+            started = time.time()
+            current, error = self.stage(task, current, prepare=True)
+            return (task_info, started, error), current
+        return None, current
+
+    # double-buffered mode: task N+1 is reverted and initialized
+    # on the standby VM while task N is predicted on the active one
+    # then they swap their roles
+    def __relay(self, pool: TaskPool) -> None:
+        active, standby = self, self.standby
+        currents = {active.index: None, standby.index: None}
+        lasts = {active.index: None, standby.index: None}
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            staged, currents[active.index] = active.pull(pool, None)
+            while staged is not None:
+                lasts[active.index] = staged[0]
+                future = executor.submit(
+                    standby.pull,
+                    pool,
+                    currents[standby.index],
+                    lasts[standby.index]
+                )
+                active.close(staged[0], active.counter, *staged[1:])
+                staged, currents[standby.index] = future.result()
+                active, standby = standby, active
+        finally:
+            executor.shutdown()
+            Worker.release(currents[self.standby.index])
+            Worker.release(currents[self.index])
+
+    # run tasks in pool one by one
+    def drain(self, pool: TaskPool, counter: Counter) -> None:
+        current, last = None, None
+        try:
+            while (task_info := pool.pull(self.primary, last, self.index)) is not None:
+                current = self.run(task_info, counter, current)
+                last = task_info
+        finally:
+            Worker.release(current)
+
+    async def adrain(self, pool: TaskPool, counter: Counter) -> None:
+        current, last = None, None
+        try:
+            while (task_info := await asyncio.to_thread(
+                pool.pull,
+                self.primary,
+                last,
+                self.index
+            )) is not None:
+                current = await self.arun(task_info, counter, current)
+                last = task_info
+        finally:
+            await asyncio.to_thread(Worker.release, current)
+
+    def __call__(self, pool: TaskPool) -> None:
+        self.pool = pool
+        if self.standby is not None:
+            self.standby.pool = pool
+            self.__relay(pool)
+
+        # standby only pulls VM tasks if it is not primary
+        # so the rest are drained without double buffering
+        self.drain(pool, self.counter)
+
+
 class Tester:
     SHUTDOWN_INTERVAL = 10
 
@@ -231,15 +769,22 @@ class Tester:
         logs_path: str,
         community: Community,
         obs_types: Set[str] = {OBS.screenshot},
-        vm_path: Optional[str] = None,
+        vm_path: Optional[Union[str, List[str]]] = None,
         headless: bool = False,
         ignore: bool = True,
         debug: bool = False,
         optimize: bool = True,
         relative: bool = False,
+        standby: bool = False,
+        asynchronous: bool = False,
+        attempts: int = 3,
+        budget: Optional[float] = None,
+        max_steps: Optional[int] = None,
         split = 1,
         rank = 0,
-        handle_managers: Callable = Presets.spawn_managers    
+        handle_managers: Callable = Presets.spawn_managers,
+        handle_modules: Callable = Presets.spawn_modules,
+        manifest_path: Optional[str] = None
     ) -> None:
         assert isinstance(tasks_path, str)
         tasks_path = os.path.expanduser(tasks_path)
@@ -278,17 +823,17 @@ class Tester:
         assert isinstance(obs_types, Iterable)
         self.obs_types = obs_types
 
+        # one worker is spawned for each VM
+        # all of them pull tasks from a shared pool
         if isinstance(vm_path, str):
-            vm_path = os.path.expanduser(vm_path)
+            vm_path = [vm_path]
+        if vm_path is None:
+            self.vm_paths = [None]
         else:
-            assert vm_path is None
-        self.vm_path = vm_path
-
-        # manager in managers should not be Manager itself
-        assert hasattr(handle_managers, "__call__")
-        self.manager_args = handle_managers(headless, vm_path)
-        self.managers = {}
-        self.modules = Presets.spawn_modules()
+            assert isinstance(vm_path, list) and len(vm_path) > 0
+            self.vm_paths = [os.path.expanduser(path) for path in vm_path]
+            assert len(set(self.vm_paths)) == len(self.vm_paths)
+        self.vm_path = self.vm_paths[0]
 
         assert isinstance(ignore, bool)
         self.ignore = ignore
@@ -299,11 +844,67 @@ class Tester:
         assert isinstance(optimize, bool)
         self.optimize = optimize
 
+        # finished tasks are looked up here instead of logs
+        self.journal = Journal(self.logs_path)
+        self.journal.vlog.set(self.log)
+
+        # manager in managers should not be Manager itself
+        # modules can be replaced by simulated ones, e.g. in bench
+        assert hasattr(handle_managers, "__call__")
+        assert hasattr(handle_modules, "__call__")
+        self.modules = handle_modules()
+        self.workers = [
+            Worker(
+                index=index,
+                log=self.log if index == 0 else Log(global_vlog=False),
+                community=self.community if index == 0 else community.clone(),
+                manager_args=handle_managers(headless, path),
+                modules=self.modules,
+                logs_path=self.logs_path,
+                journal=self.journal,
+                ignore=self.ignore,
+                optimize=self.optimize,
+                budget=budget,
+                max_steps=max_steps
+            ) for index, path in enumerate(self.vm_paths)
+        ]
+        self.manager_args = self.workers[0].manager_args
+        self.managers = self.workers[0].managers
+
+        # double-buffered mode: VMs are paired as active and standby
+        assert isinstance(standby, bool)
+        if standby:
+            assert self.optimize
+            assert len(self.workers) % 2 == 0
+            for leader, follower in zip(self.workers[::2], self.workers[1::2]):
+                leader.standby = follower
+            self.leaders = self.workers[::2]
+        else:
+            self.leaders = self.workers
+
+        # asynchronous mode: workers share one thread & event loop
+        # which is not combined with double-buffered mode
+        # models are requested by httpx, see Model.async_client
+        assert isinstance(asynchronous, bool)
+        assert not (asynchronous and standby)
+        assert not asynchronous or importlib.util.find_spec("httpx") is not None, \
+            "Asynchronous mode requires httpx: pip install httpx"
+        self.asynchronous = asynchronous
+
         assert isinstance(relative, bool)
         self.relative = relative
 
+        # skipped tasks are tried at most `attempts` times in total
+        assert isinstance(attempts, int) and attempts > 0
+        self.attempts = attempts
+
+        # parsed configs are cached across runs
+        self.manifest = Manifest(self.tasks_path, manifest_path)
+        self.manifest.vlog.set(self.log)
+
         self.task_info: List[TaskInfo] = []
         self.__traverse()
+        self.manifest.save()
         self.task_group = TaskGroup(sorted(self.task_info))
         print("debug")
     def __del__(self) -> None:
@@ -311,24 +912,15 @@ class Tester:
             self.__temp_dir.cleanup()
 
     def __manager(self, type_sort: TypeSort):
-        # add __str__() to differentiate all managers
-        if str(type_sort) in self.managers:
-            return self.managers[str(type_sort)]
-
-        manager_class = getattr(
-            self.modules[type_sort.type],
-            type_sort(Manager.__name__)
-        )
-
-        manager_args = self.manager_args[type_sort]()
-        manager = manager_class(**manager_args)
-        self.managers[str(type_sort)] = manager
-        manager.vlog.set(self.log)
-        return manager
+        return self.workers[0].manager(type_sort)
 
     def __load(self, config_path: str) -> Task:
         # using nil agent & manager only to load type field
-        type_sort = Task(config_path=config_path).type_sort
+        # which is skipped if config is recorded in manifest
+        config, type_sort = self.manifest(
+            config_path,
+            lambda config: Task(config_path=config_path, config=config).type_sort
+        )
         if type_sort.sort == TypeSort.Sort.VM:
             assert self.vm_path is not None
 
@@ -339,6 +931,7 @@ class Tester:
 
         return task_class(
             config_path=config_path,
+            config=config,
             manager=self.__manager(type_sort),
             community=self.community,
             obs_types=self.obs_types,
@@ -346,14 +939,22 @@ class Tester:
             relative=self.relative
         )
 
+    # a fresh task to retry, as states of task are consumed
+    def __renew(self, task_info: TaskInfo) -> TaskInfo:
+        new_task = self.__load(task_info.task.path)
+        new_task.vlog.set(self.log)
+        return TaskInfo(new_task, infix=task_info.infix)
+
     def __traverse(self, current_infix: str = "") -> None:
         current_dir_path = os.path.join(self.tasks_path, current_infix)
         all_pth = sorted(os.listdir(current_dir_path))
-        res_dir = os.path.join('logs', os.environ.get('SUBFOLDER'))
-        finished = os.listdir(res_dir)
-        finished = [f + '.json' for f in finished]
-        all_pth = set(all_pth).difference(set(finished))
-        all_pth = sorted(list(all_pth))
+        all_pth = [
+            name for name in all_pth
+            if not name.startswith(Manifest.FILENAME)
+            and not (self.ignore and self.journal.finished(
+                os.path.join(current_infix, name.split(".")[0])
+            ))
+        ]
 
         SPLITE = int(os.environ.get("SPLITE", 1))
         INDEX = int(os.environ.get("INDEX", 0))
@@ -420,38 +1021,198 @@ class Tester:
             )
             method(self, local_counter)
             local_counter.callback()
+            self.__dump_timing(local_counter)
+            self.log.info(
+                "\033[1mOverall in journal: "
+                + str(Counter(**self.journal.totals()))
+                + "\033[0m"
+            )
             self.log.callback()
             Manager.pause(Tester.SHUTDOWN_INTERVAL)
+            return local_counter
         return _log_wrapper
 
+    def __dump_timing(self, counter: Counter) -> None:
+        try:
+            Timing.dump(
+                os.path.join(self.logs_path, Log.SUM_LOG_PREFIX + Log.TIMING_FILENAME),
+                summary=Timing.summary(counter.timings)
+            )
+        except Exception as err:
+            self.log.error(f"Timing cannot be saved: {err}")
+
     # there is no need to pass counter
     # as decorator has done all for it
     @_log_handler
     def __call__(self, counter: Counter) -> None:
-        generator = self.task_group(self.logs_path, self.ignore)
+        # asynchronous mode is served by coroutines even with one VM
+        if len(self.workers) > 1 or self.asynchronous:
+            return self.__dispatch(counter)
+
+        # managers are entered by task group here
+        # skipped tasks are retried at the end of the run
+        worker = self.workers[0]
+        worker.pool = self.__pool([])
+        generator = self.task_group(self.journal, self.ignore)
         for task_info in generator if self.optimize else self.task_info:
-            with self.log(
-                base_path=self.logs_path,
-                ident=task_info.ident,
-                ignore=self.ignore
-            ) as result_exist:
-                if result_exist:
-                    counter._ignore()
-                    continue
-                try:
-                    counter._pass() if task_info() else counter._fail()
-                except Exception:
-                    counter._skip()
+            worker.run(task_info, counter)
+        worker.drain(worker.pool, counter)
+
+    def __pool(self, raw: List[TaskInfo]) -> TaskPool:
+        return TaskPool(raw, renew=self.__renew, attempts=self.attempts)
+
+    def __dispatch(self, counter: Counter) -> None:
+        pool = self.__pool(sorted(self.task_info))
+        for worker in self.workers:
+            worker.counter = Counter()
+            worker.counter.vlog.set(worker.log)
+
+        if self.asynchronous:
+            asyncio.run(self.__gather(pool))
+        else:
+            self.__spawn(pool)
+
+        for worker in self.workers:
+            counter += worker.counter
+            if worker.log is not self.log:
+                worker.log.callback()
+
+    def __spawn(self, pool: TaskPool) -> None:
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(pool,),
+                name=f"Worker-{worker.index}"
+            ) for worker in self.leaders
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # at most one blocking call of each worker is running at a time
+    async def __gather(self, pool: TaskPool) -> None:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=len(self.workers))
+        )
+        for worker in self.workers:
+            worker.pool = pool
+        await asyncio.gather(*[
+            worker.adrain(pool, worker.counter)
+            for worker in self.workers
+        ])
+
+    @staticmethod
+    def _plan(
+        param: Dict[str, Any],
+        check_only: bool = False,
+        results: Optional[multiprocessing.Queue] = None,
+        index: int = 0
+    ) -> Optional[Counter]:
+        counter = None
+        try:
+            assert isinstance(param, dict)
+            tester = Tester(**param)
+            counter = Counter() if check_only else tester()
+        except Exception:
+            traceback.print_exc()
+        finally:
+            if results is not None:
+                results.put((index, None if counter is None else counter._asdict()))
+        return counter
 
     # alternative for multiple Tester(...)()
+    # - processes > 1: run plans in forked processes at the same time
+    #   so that params need not to be picklable
+    # - vm_paths: VMs evenly and exclusively allotted to running plans
+    #   whose param does not contain vm_path
     @staticmethod
-    def plan(params: List[Dict[str, Any]], check_only: bool = False) -> None:
+    def plan(
+        params: List[Dict[str, Any]],
+        check_only: bool = False,
+        processes: int = 1,
+        vm_paths: Optional[List[str]] = None
+    ) -> Counter:
         assert isinstance(params, list)
-        for param in params:
+        assert isinstance(processes, int) and processes > 0
+
+        if vm_paths is not None:
+            assert isinstance(vm_paths, list) and len(vm_paths) > 0
+            share = max(len(vm_paths) // max(min(processes, len(params)), 1), 1)
+
+        # fork is not available under Windows
+        if "fork" not in multiprocessing.get_all_start_methods():
+            processes = 1
+
+        def allot(param: Dict[str, Any], free: List[str]) -> List[str]:
+            if vm_paths is None or "vm_path" in param:
+                return []
+            allotted = free[:share]
+            del free[:share]
+            param["vm_path"] = allotted
+            return allotted
+
+        total, free = Counter(), list(vm_paths or [])
+        def collect(index: int, counter: Optional[Counter]) -> None:
+            nonlocal total
+            if counter is None:
+                print(f"Plan {index}: failed.")
+            else:
+                print(f"Plan {index}: {counter}")
+                total += counter
+
+        if processes == 1:
+            for index, param in enumerate(params):
+                if isinstance(param, dict):
+                    param = param.copy()
+                    free.extend(allot(param, free))
+                collect(index, Tester._plan(param, check_only))
+            print(f"All plans: {total}")
+            return total
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        pending = list(enumerate(params))
+        running: Dict[int, Tuple[multiprocessing.Process, List[str]]] = {}
+
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < processes:
+                index, param = pending[0]
+                if isinstance(param, dict):
+                    if vm_paths is not None \
+                        and "vm_path" not in param \
+                        and len(free) < share:
+                        break
+                    param = param.copy()
+                    allotted = allot(param, free)
+                else:
+                    allotted = []
+
+                process = context.Process(
+                    target=Tester._plan,
+                    args=(param, check_only, results, index),
+                    name=f"Plan-{index}"
+                )
+                process.start()
+                running[index] = (process, allotted)
+                pending.pop(0)
+
             try:
-                assert isinstance(param, dict)
-                tester = Tester(**param)
-                if not check_only:
-                    tester()
-            except Exception:
-                traceback.print_exc()
+                index, fields = results.get(timeout=1)
+            except queue.Empty:
+                # a process killed before reporting frees its VMs as well
+                dead = [
+                    index for index, (process, _) in running.items()
+                    if process.exitcode is not None
+                ]
+                if len(dead) == 0:
+                    continue
+                index, fields = dead[0], None
+
+            process, allotted = running.pop(index)
+            process.join()
+            free.extend(allotted)
+            collect(index, None if fields is None else Counter(**fields))
+
+        print(f"All plans: {total}")
+        return total
@@ -10,18 +10,29 @@ from .base import VMType
 from .base import Log
 from .base import VirtualLog
 from .base import GLOBAL_VLOG
+from .base import Timing
+
+from .base import ResponseCache
+from .base import Balancer
+from .base import Retry
+from .base import Breaker
 
 from .base import Content
 from .base import TextContent
 from .base import ImageContent
+from .base import ImagePolicy
 from .base import Message
 from .base import Model
+from .base import Context
+from .base import History
 
 from .base import ModelType
 from .base import RoleType
 
 from .base import Primitive
 from .base import CodeLike
+from .base import Action
+from .base import Grammar
 
 from .base import PromptFactory
 from .base import AIOPromptFactory
@@ -29,6 +40,7 @@ from .base import PlannerPromptFactory
 from .base import GrounderPromptFactory
 
 from .base import Overflow
+from .base import Estimator
 from .base import Agent
 from .base import AIOAgent
 from .base import PlannerAgent
@@ -41,6 +53,8 @@ from .base import SeeAct
 from .base import OBS
 from .base import Manager
 from .base import Task
+from .base import Manifest
+from .base import Journal
 
 from .vm import VManager
 from .vm import VTask
@@ -59,6 +73,8 @@ from .Tester import Automata
 
 from .Tester import TaskInfo
 from .Tester import TaskGroup
+from .Tester import TaskPool
+from .Tester import Worker
 from .Tester import Tester
 
 # DO NOT IMPORT TEMPLATE
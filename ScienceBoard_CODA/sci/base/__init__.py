@@ -9,18 +9,29 @@ from .utils import VMType
 from .log import Log
 from .log import VirtualLog
 from .log import GLOBAL_VLOG
+from .timing import Timing
+
+from .cache import ResponseCache
+from .balancer import Balancer
+from .retry import Retry
+from .retry import Breaker
 
 from .model import Content
 from .model import TextContent
 from .model import ImageContent
+from .model import ImagePolicy
 from .model import Message
 from .model import Model
+from .context import Context
+from .context import History
 
 from .model import ModelType
 from .model import RoleType
 
 from .prompt import Primitive
 from .prompt import CodeLike
+from .grammar import Action
+from .grammar import Grammar
 
 from .prompt import PromptFactory
 from .prompt import AIOPromptFactory
@@ -28,6 +39,7 @@ from .prompt import PlannerPromptFactory
 from .prompt import GrounderPromptFactory
 
 from .agent import Overflow
+from .agent import Estimator
 from .agent import Agent
 from .agent import AIOAgent
 from .agent import PlannerAgent
@@ -41,3 +53,5 @@ from .manager import OBS
 from .manager import Manager
 
 from .task import Task
+from .manifest import Manifest
+from .journal import Journal
@@ -1,10 +1,12 @@
 import copy
 import sys
+import asyncio
+import math
 import functools
 import string
 import os
-from typing import Optional, List, Tuple, Dict
-from typing import Callable, Any, Set, FrozenSet
+from typing import Optional, List, Tuple, Dict, Union
+from typing import Callable, Any, Set, FrozenSet, Self
 
 from PIL import Image
 from requests import Response
@@ -14,9 +16,11 @@ sys.dont_write_bytecode = True
 from . import utils
 from .manager import OBS, Manager
 from .log import VirtualLog
+from .timing import Timing
 from .model import Content, TextContent, ImageContent
 from .model import Message, Model
-from .utils import TypeSort
+from .context import Context, History
+from .utils import TypeSort, relative_py
 from .prompt import CodeLike, Primitive
 from .prompt import AIOPromptFactory
 from .prompt import PlannerPromptFactory
@@ -50,6 +54,47 @@ class Overflow:
         return response.json()["error"]["type"] == "request_too_large"
 
 
+# local estimation of prompt tokens, by families of models
+# - texts: about 4 ASCII chars or 1 other char per token
+# - images: by sizes after ImagePolicy, following docs of each family
+# estimations are coarse, so context_limit should keep some margin
+class Estimator:
+    MESSAGE_OVERHEAD = 4
+
+    @staticmethod
+    def text(text: str) -> int:
+        ascii_count = len(text.encode("ascii", errors="ignore"))
+        return math.ceil(ascii_count / 4) + len(text) - ascii_count
+
+    # fit in 2048x2048, shorter side to 768, then 170 per 512px tile
+    @staticmethod
+    def openai(width: int, height: int, detail: str) -> int:
+        if detail == "low":
+            return 85
+        ratio = min(2048 / max(width, height), 1)
+        ratio = min(768 / (min(width, height) * ratio), 1) * ratio
+        tiles = math.ceil(width * ratio / 512) * math.ceil(height * ratio / 512)
+        return 85 + 170 * tiles
+
+    # smart resize to multiples of 28, one token per 28x28 patch
+    @staticmethod
+    def qwen(width: int, height: int, *_) -> int:
+        min_pixels, max_pixels = 56 * 56, 28 * 28 * 16384
+        ratio = 1.0
+        if width * height > max_pixels:
+            ratio = math.sqrt(max_pixels / (width * height))
+        elif width * height < min_pixels:
+            ratio = math.sqrt(min_pixels / (width * height))
+        patches = max(round(width * ratio / 28), 1) * max(round(height * ratio / 28), 1)
+        return patches + 2
+
+    # fit in 1568 on the longer side, then pixels / 750
+    @staticmethod
+    def anthropic(width: int, height: int, *_) -> int:
+        ratio = min(1568 / max(width, height), 1)
+        return math.ceil(width * ratio * height * ratio / 750)
+
+
 class Agent:
     def __init__(
         self,
@@ -57,7 +102,14 @@ class Agent:
         overflow_style: Optional[str] = None,
         context_window: int = 15, # support longer
         hide_text: bool = False,
-        code_style: str = "antiquot"
+        code_style: str = "antiquot",
+        estimate_style: Optional[str] = None,
+        context_limit: Optional[int] = None,
+        context_capacity: Optional[int] = None,
+        context_memory: Optional[int] = None,
+        context_images: Optional[int] = None,
+        history_style: str = "drop",
+        history_images: Optional[int] = None
     ) -> None:
         assert isinstance(model, Model)
         self.model = model
@@ -75,21 +127,129 @@ class Agent:
         assert isinstance(hide_text, bool)
         self.hide_text = hide_text
 
+        # context window is shortened in advance to fit in context_limit
+        # so that overflow handlers are only left as a fallback
+        assert estimate_style is None or hasattr(Estimator, estimate_style)
+        self.estimate_style = estimate_style
+        self.estimate_handler: Optional[Callable[[int, int, str], int]] = None \
+            if estimate_style is None \
+            else getattr(Estimator, estimate_style)
+
+        assert context_limit is None or context_limit > 0
+        self.context_limit = context_limit
+
+        # bounds of conversation for long tasks, see Context
+        # images are only sent in the last `context_images` messages if set
+        self.context_capacity = context_capacity
+        self.context_memory = context_memory
+        assert context_images is None or context_images >= 0
+        self.context_images = context_images
+
+        # older images are sent through History in `history_images` messages
+        # and released from memory beyond, see Context.view()
+        assert hasattr(History, history_style)
+        self.history_style = history_style
+        self.history_handler: Callable[[ImageContent], Optional[Content]] = \
+            getattr(History, history_style)
+
+        assert history_images is None or history_images >= 0
+        self.history_images = history_images
+
         assert hasattr(CodeLike, handler_name:=f"extract_{code_style}")
         self.code_style = code_style
-        self.code_handler: Callable[
+        self.code_extractor: Callable[
             [Content, Set[str], List[List[int]]],
             List[CodeLike]
         ] = getattr(CodeLike, handler_name)
 
+        # sizes of the last screen and of the image sent for it
+        self.screen_size: Optional[Tuple[int, int]] = None
+        self.image_size: Optional[Tuple[int, int]] = None
+
         self.vlog = VirtualLog()
 
+    # messages whose images are kept, the rest are never sent again
+    @property
+    def context_retain(self) -> Optional[int]:
+        if self.context_images is None:
+            return None
+        if self.history_style == "drop":
+            return self.context_images
+        if self.history_images is None:
+            return None
+        return self.context_images + self.history_images
+
+    @property
+    def span(self) -> Optional[Tuple[int, int]]:
+        return None if self.image_size == self.screen_size else self.image_size
+
+    def _observe_image(self, image: Image.Image) -> ImageContent:
+        self.screen_size = image.size
+        self.image_size = self.model.image_policy.size(image.size)
+        return ImageContent(image, self.model.image_policy)
+
+    # coordinates from model are in the space of the image sent
+    # so are tags of SoM converted into, then mapped back by Task
+    def code_handler(
+        self,
+        content: Content,
+        primitives: Set[str] = set(),
+        tags: Optional[List[List[int]]] = None,
+        *args,
+        code_style: Optional[str] = None,
+        **kwargs
+    ) -> List[CodeLike]:
+        # responses may be parsed in another style than prompted
+        code_extractor = self.code_extractor if code_style is None \
+            else getattr(CodeLike, f"extract_{code_style}")
+        if (span := self.span) is None:
+            return code_extractor(content, primitives, tags, *args, **kwargs)
+
+        x_ratio = span[0] / self.screen_size[0]
+        y_ratio = span[1] / self.screen_size[1]
+        if tags is not None:
+            tags = [[
+                round(cord_x * x_ratio),
+                round(cord_y * y_ratio),
+                round(width * x_ratio),
+                round(height * y_ratio)
+            ] for cord_x, cord_y, width, height in tags]
+
+        codes = code_extractor(content, primitives, tags, *args, **kwargs)
+        for code in codes:
+            # codes with relative coordinates need no mapping
+            if not code.prefix.startswith(relative_py):
+                code.span = span
+        return codes
+
+    # whether a streamed text holds an action already, see Model.stream
+    # texts taken as descriptions by the extractor do not count
+    def complete(self, text: str) -> bool:
+        return CodeLike.complete(self.code_style, text)
+
+    # share model and handlers, but not the conversation
+    # so that clones can serve different tasks at the same time
+    def clone(self) -> Self:
+        agent = copy.copy(self)
+        agent.vlog = VirtualLog()
+        agent.__dict__.pop("system_message", None)
+        agent.__dict__.pop("context", None)
+        return agent
+
+    def _context(self) -> Context:
+        return Context(
+            self.context_capacity,
+            self.context_memory,
+            self.context_retain
+        )
+
     def _init(self, inst: str) -> None:
         self.system_message: Message = self.model.message(
             role="system",
             content=[TextContent(inst.strip())]
         )
-        self.context: List[Message] = []
+        self.context = self._context()
+        self.screen_size, self.image_size = None, None
 
     @staticmethod
     def _init_handler(method: Callable) -> Callable:
@@ -112,42 +272,110 @@ class Agent:
     def __dump(self, context_count: int) -> List[Message]:
         return [
             self.system_message,
-            *self.context[-context_count:]
+            *self.context.view(context_count)
         ]
 
-    def dump_payload(self, context_length: int) -> Dict:
-        if os.getenv("QWEN_PLANNER", '0') == "1":
-            payload = self._Agent__dump(31)
-            payload = copy.deepcopy(payload)
-            for i in reversed(range(len(payload) - 4)):
-                if payload[i].role == 'user':
-                    del payload[i]
-            if payload[-1].role == 'user':
-                task = self.system_message.content[0].text.split('User Instruction\n')[1]
-                payload[-1].content.append(TextContent('Task: ' + task))
-        else:
-            payload = self.__dump(context_length * 2 + 1)
+    # count of messages, and of user turns kept among them
+    # user turns are left out except for the last `keep` messages
+    # the window of QWEN_PLANNER does not depend on context_length
+    @staticmethod
+    def __window(context_length: Optional[int]) -> Tuple[int, Optional[int]]:
+        planner = os.getenv("QWEN_PLANNER", '0') == "1"
+        count, keep = (31, 4) if planner else (context_length * 2 + 1, None)
         if os.getenv("NO_CONTEXT_IMAGE", "0") == "1":
-            for i in reversed(range(len(payload) - 1)):
-                if payload[i].role == 'user':
-                    del payload[i]
+            keep = 1
+        return count, keep
+
+    # messages are viewed instead of copied
+    # only the last message may be rebuilt, e.g. for QWEN_PLANNER
+    def __select(self, context_length: Optional[int]) -> List[Message]:
+        planner = os.getenv("QWEN_PLANNER", '0') == "1"
+        count, keep = Agent.__window(context_length)
+
+        payload = [self.system_message, *self.context.view(
+            count,
+            drop=None if keep is None else "user",
+            keep=keep or 0,
+            images=self.context_images,
+            history=self.history_handler,
+            reduced=self.history_images
+        )]
+        if planner and payload[-1].role == 'user':
+            task = self.system_message.content[0].text.split('User Instruction\n')[1]
+            last = payload[-1]
+            payload[-1] = Message(
+                style=last.style,
+                role=last.role,
+                content=[*last.content, TextContent('Task: ' + task)],
+                context_window=last.context_window
+            )
+        return payload
+
+    def dump_payload(self, context_length: Optional[int]) -> List[Dict]:
+        payload = self.__select(context_length)
         return [message._asdict(hide_text=(
             not index + 1 == len(payload) and self.hide_text
         )) for index, message in enumerate(payload)]
 
+    def estimate(self, payload: List[Message]) -> int:
+        tokens = 0
+        for index, message in enumerate(payload):
+            hide_text = not index + 1 == len(payload) and self.hide_text
+            tokens += Estimator.MESSAGE_OVERHEAD
+            for content in message.content:
+                if isinstance(content, ImageContent):
+                    tokens += self.estimate_handler(
+                        *content.policy.size(content.image.size),
+                        content.policy.detail
+                    )
+                else:
+                    tokens += Estimator.text(content._asdict(
+                        hide_text=hide_text,
+                        use_format=message.role=="user"
+                    )["text"])
+        return tokens
+
+    # the largest context length not above `context_length` that fits
+    # the shortest if none fits; left as it is if the window ignores it
+    def _fit(self, context_length: int) -> int:
+        if self.estimate_handler is None or self.context_limit is None:
+            return context_length
+        if Agent.__window(context_length) == Agent.__window(0):
+            return context_length
+
+        budget = self.context_limit - (self.model.max_tokens or 0)
+        for length in range(context_length, -1, -1):
+            if (tokens := self.estimate(self.__select(length))) <= budget:
+                break
+        else:
+            self.vlog.warning(
+                f"Estimated {tokens} tokens for {self.model.model_name} "
+                f"over the limit even with context_window=0."
+            )
+            return 0
+
+        if length < context_length:
+            self.vlog.info(
+                f"Estimated {tokens} tokens for {self.model.model_name}; "
+                f"set context_window={length} in advance."
+            )
+        return length
+
+    # same as dump_payload(), but messages are dumped as JSON fragments
+    # which are cached in messages and reused in the following steps
+    def dump_fragments(self, context_length: Optional[int]) -> List[str]:
+        payload = self.__select(context_length)
+        return [message.dumps(hide_text=(
+            not index + 1 == len(payload) and self.hide_text
+        )) for index, message in enumerate(payload)]
+
     def dump_history(self, hide: bool) -> Tuple[Dict, Dict]:
         return [
             message._asdict(show_context=True, hide_text=hide, hide_image=hide)
             for message in self.__dump(len(self.context))
         ]
 
-    def __call__(
-        self,
-        contents: List[Content],
-        shorten: int = 0,
-        retry: int = 3,
-        timeout: int = Manager.HETERO_TIMEOUT
-    ) -> Message:
+    def __push(self, contents: List[Content], shorten: int, retry: int) -> int:
         assert hasattr(self, "context"), "Call _init() first"
         assert retry > 0, f"Max reties exceeded when calling {self.model.model_name}"
 
@@ -159,16 +387,19 @@ class Agent:
         assert context_length >= 0, "Error when calculating context length"
 
         self.context.append(self.model.message(role="user", content=contents))
-        while True:
-            try:
-                payload = self.dump_payload(context_length)
-                response = self.model(payload, timeout)
-                response.json()
-                break
-            except:
-                self.vlog.info(f"message model fail\n" + response.text)
-                time.sleep(1)
+        context_length = self._fit(context_length)
+        self.vlog.timing.check()
+        return context_length
 
+    # the response message if settled
+    # otherwise args to request again with, and seconds to wait before
+    def __settle(
+        self,
+        response: Response,
+        context_length: int,
+        shorten: int,
+        retry: int
+    ) -> Union[Message, Tuple[List[Content], int, int, float]]:
         is_overflow = False if self.overflow_handler is None \
             else self.overflow_handler(response)
 
@@ -177,7 +408,9 @@ class Agent:
                 f"Overflow detected when requesting {self.model.model_name}; "
                 f"set context_window={context_length - 1}."
             )
-            return self(self.context.pop().content, shorten + 1, retry, timeout)
+            # shorten from the length actually sent, which may be fitted
+            shorten = self.context_window - context_length + 1
+            return self.context.pop().content, shorten, retry, 0
         assert not is_overflow, f"Unsolvable overflow when requesting {self.model.model_name}"
 
         response_message = self.model.access(response, context_length)
@@ -186,12 +419,69 @@ class Agent:
                 f"Unexpected error when requesting {self.model.model_name}.\n"
                     + response.text
             )
-            Manager.pause(Primitive.WAIT_TIME)
-            return self(self.context.pop().content, shorten, retry - 1, timeout)
+            return self.context.pop().content, shorten, retry - 1, Primitive.WAIT_TIME
 
         self.context.append(response_message)
         return response_message
 
+    def __call__(
+        self,
+        contents: List[Content],
+        shorten: int = 0,
+        retry: int = 3,
+        timeout: int = Manager.HETERO_TIMEOUT
+    ) -> Message:
+        context_length = self.__push(contents, shorten, retry)
+        timing = self.vlog.timing
+
+        # transient failures are retried by Model with backoff
+        # the task is given up by Tester once retries are exhausted
+        # or stopped as TIMEOUT if its deadline has passed meanwhile
+        payload = self.dump_fragments(context_length)
+        with timing(Timing.MODEL), timing.guard():
+            response = self.model(
+                payload,
+                timing.remaining(timeout),
+                deadline=timing.deadline,
+                log=self.vlog.warning,
+                until=self.complete
+            )
+
+        settled = self.__settle(response, context_length, shorten, retry)
+        if isinstance(settled, Message):
+            return settled
+        *args, wait = settled
+        Manager.pause(wait)
+        return self(*args, timeout)
+
+    # same as __call__(), but yields while awaiting the model
+    async def acall(
+        self,
+        contents: List[Content],
+        shorten: int = 0,
+        retry: int = 3,
+        timeout: int = Manager.HETERO_TIMEOUT
+    ) -> Message:
+        context_length = self.__push(contents, shorten, retry)
+        timing = self.vlog.timing
+
+        payload = self.dump_fragments(context_length)
+        with timing(Timing.MODEL), timing.guard():
+            response = await self.model.acall(
+                payload,
+                timing.remaining(timeout),
+                deadline=timing.deadline,
+                log=self.vlog.warning,
+                until=self.complete
+            )
+
+        settled = self.__settle(response, context_length, shorten, retry)
+        if isinstance(settled, Message):
+            return settled
+        *args, wait = settled
+        await asyncio.sleep(wait)
+        return await self.acall(*args, timeout)
+
 
 class AIOAgent(Agent):
     USER_FLATTERY = "What's the next step that you will do to help with the task?"
@@ -235,7 +525,7 @@ class AIOAgent(Agent):
             item for _, item in obs.items()
             if isinstance(item, Image.Image)
         ]
-        contents += [ImageContent(image) for image in images]
+        contents += [self._observe_image(image) for image in images]
         return contents
 
 
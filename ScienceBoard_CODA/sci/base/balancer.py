@@ -0,0 +1,157 @@
+import sys
+import os
+import time
+import threading
+import requests
+
+from typing import Optional, List, Dict, Callable, Awaitable, TypeVar
+
+sys.dont_write_bytecode = True
+
+T = TypeVar("T")
+
+
+# spread requests over replicas of one model server
+# - route to the endpoint with least outstanding requests
+#   ties are broken in turn, so that serial requests rotate as well
+# - eject an endpoint for `ejection` seconds after `max_errors` errors in a row
+# - probe every endpoint each `interval` seconds in background:
+#   a 2xx response readmits it, any other or none ejects it
+class Balancer:
+    INTERVAL = 30
+    EJECTION = 60
+    MAX_ERRORS = 3
+    PROBE_TIMEOUT = 5
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        probe: Optional[Callable[[str], str]] = None,
+        proxies: Optional[Dict] = None,
+        interval: Optional[float] = INTERVAL,
+        ejection: float = EJECTION,
+        max_errors: int = MAX_ERRORS
+    ) -> None:
+        assert isinstance(endpoints, list) and len(endpoints) > 0
+        for endpoint in endpoints:
+            assert isinstance(endpoint, str)
+        assert len(set(endpoints)) == len(endpoints)
+        self.endpoints = endpoints
+
+        # map endpoints to URLs for health checks
+        self.probe = (lambda endpoint: endpoint) if probe is None else probe
+        self.proxies = proxies
+
+        assert interval is None or interval > 0
+        self.interval = interval
+
+        assert ejection > 0
+        self.ejection = ejection
+
+        assert isinstance(max_errors, int) and max_errors > 0
+        self.max_errors = max_errors
+
+        self.outstanding = {endpoint: 0 for endpoint in endpoints}
+        self.errors = {endpoint: 0 for endpoint in endpoints}
+        self.ejected = {endpoint: 0.0 for endpoint in endpoints}
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.watcher: Optional[int] = None
+
+    def __eject(self, endpoint: str) -> None:
+        self.ejected[endpoint] = time.time() + self.ejection
+        self.errors[endpoint] = 0
+
+    # all endpoints being ejected, the one to return earliest is used
+    def acquire(self) -> str:
+        self.__watch()
+        with self.lock:
+            now = time.time()
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if self.ejected[endpoint] <= now
+            ] or [min(self.endpoints, key=lambda endpoint: self.ejected[endpoint])]
+
+            offset = self.cursor % len(candidates)
+            self.cursor += 1
+            endpoint = min(
+                candidates[offset:] + candidates[:offset],
+                key=lambda endpoint: self.outstanding[endpoint]
+            )
+            self.outstanding[endpoint] += 1
+            return endpoint
+
+    def release(self, endpoint: str, succeeded: bool) -> None:
+        with self.lock:
+            self.outstanding[endpoint] -= 1
+            if succeeded:
+                self.errors[endpoint] = 0
+            else:
+                self.errors[endpoint] += 1
+                if self.errors[endpoint] >= self.max_errors:
+                    self.__eject(endpoint)
+
+    # usage: balancer(lambda url: requests.post(url, ...), check)
+    # exceptions and results failing `check` are counted as errors
+    def __call__(
+        self,
+        request: Callable[[str], T],
+        check: Callable[[T], bool] = lambda _: True
+    ) -> T:
+        endpoint = self.acquire()
+        succeeded = False
+        try:
+            result = request(endpoint)
+            succeeded = check(result)
+            return result
+        finally:
+            self.release(endpoint, succeeded)
+
+    async def acall(
+        self,
+        request: Callable[[str], Awaitable[T]],
+        check: Callable[[T], bool] = lambda _: True
+    ) -> T:
+        endpoint = self.acquire()
+        succeeded = False
+        try:
+            result = await request(endpoint)
+            succeeded = check(result)
+            return result
+        finally:
+            self.release(endpoint, succeeded)
+
+    def alive(self, endpoint: str) -> bool:
+        try:
+            return requests.get(
+                self.probe(endpoint),
+                proxies=self.proxies,
+                timeout=Balancer.PROBE_TIMEOUT
+            ).status_code // 100 == 2
+        except requests.RequestException:
+            return False
+
+    # threads do not survive fork, so start one in each process
+    def __watch(self) -> None:
+        if self.interval is None or self.watcher == os.getpid():
+            return
+        with self.lock:
+            if self.watcher == os.getpid():
+                return
+            self.watcher = os.getpid()
+        threading.Thread(
+            target=self.__patrol,
+            name="Balancer",
+            daemon=True
+        ).start()
+
+    def __patrol(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            for endpoint in self.endpoints:
+                alive = self.alive(endpoint)
+                with self.lock:
+                    if alive:
+                        self.ejected[endpoint] = 0.0
+                    elif self.ejected[endpoint] <= time.time():
+                        self.__eject(endpoint)
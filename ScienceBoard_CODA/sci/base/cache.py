@@ -0,0 +1,164 @@
+import sys
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+from typing import Optional, List, Tuple, Dict, Union, Literal, Callable, Awaitable
+from requests import Response
+
+sys.dont_write_bytecode = True
+from .utils import dumps
+
+CacheMode = Literal["passthrough", "record", "replay"]
+
+
+# on-disk cache of model responses, one file per request
+# - passthrough: always request the server
+# - record: reuse recorded responses, and record new ones
+# - replay: only use recorded responses; misses raise ResponseCache.Miss
+# least recently used files are evicted beyond `limit` bytes
+class ResponseCache:
+    LIMIT = 1024 * 1024 * 1024
+    SUFFIX = ".json"
+
+    class Miss(Exception):
+        def __init__(self, key: str) -> None:
+            super().__init__(f"No recorded response for {key}")
+
+    def __init__(
+        self,
+        cache_path: str,
+        mode: CacheMode = "record",
+        limit: int = LIMIT
+    ) -> None:
+        assert isinstance(cache_path, str)
+        cache_path = os.path.expanduser(cache_path)
+        os.makedirs(cache_path, exist_ok=True)
+        self.cache_path = cache_path
+
+        assert mode in ("passthrough", "record", "replay")
+        self.mode = mode
+
+        assert isinstance(limit, int) and limit > 0
+        self.limit = limit
+
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+        self.size = sum(size for _, _, size in self.__scan())
+
+    # stable across processes, unlike hash()
+    # messages are hashed as their fragments, see Message.dumps()
+    @staticmethod
+    def key(messages: List[Union[str, Dict]], **kwargs) -> str:
+        hasher = hashlib.sha256(dumps(dict(sorted(kwargs.items()))).encode("utf-8"))
+        for message in messages:
+            fragment = message if isinstance(message, str) else dumps(message)
+            hasher.update(b"\n" + fragment.encode("utf-8"))
+        return hasher.hexdigest()
+
+    def __file_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, key + ResponseCache.SUFFIX)
+
+    def __scan(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        for file_name in os.listdir(self.cache_path):
+            if not file_name.endswith(ResponseCache.SUFFIX):
+                continue
+            try:
+                stat = os.stat(file_path := os.path.join(self.cache_path, file_name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, file_path, stat.st_size))
+        return entries
+
+    def load(self, key: str) -> Optional[Response]:
+        file_path = self.__file_path(key)
+        try:
+            with open(file_path, mode="r", encoding="utf-8") as readable:
+                record = json.load(readable)
+            # mtime is used as last access time for eviction
+            os.utime(file_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        response = Response()
+        response.status_code = record["status_code"]
+        response.headers.update(record["headers"])
+        response.url = record["url"]
+        response.encoding = "utf-8"
+        response._content = record["content"].encode("utf-8")
+        return response
+
+    # only successful responses are recorded
+    def save(self, key: str, response: Response) -> None:
+        if response.status_code != 200:
+            return
+
+        serialized = json.dumps({
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "url": response.url,
+            "content": response.text
+        }, ensure_ascii=False).encode("utf-8")
+
+        # write then rename, so that readers never see partial files
+        file_path = self.__file_path(key)
+        with tempfile.NamedTemporaryFile(dir=self.cache_path, delete=False) as writable:
+            writable.write(serialized)
+        try:
+            replaced = os.path.getsize(file_path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(writable.name, file_path)
+
+        with self.lock:
+            self.size += len(serialized) - replaced
+            if self.size > self.limit:
+                self.__evict()
+
+    # sizes are rescanned, as other processes may share the directory
+    def __evict(self) -> None:
+        entries = sorted(self.__scan())
+        self.size = sum(size for _, _, size in entries)
+        for _, file_path, size in entries:
+            if self.size <= self.limit:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def __lookup(self, key: str) -> Optional[Response]:
+        if (response := self.load(key)) is not None:
+            with self.lock:
+                self.hits += 1
+            return response
+
+        with self.lock:
+            self.misses += 1
+        if self.mode == "replay":
+            raise ResponseCache.Miss(key)
+        return None
+
+    def __call__(self, key: str, request: Callable[[], Response]) -> Response:
+        if self.mode == "passthrough":
+            return request()
+        if (response := self.__lookup(key)) is not None:
+            return response
+
+        response = request()
+        self.save(key, response)
+        return response
+
+    async def acall(self, key: str, request: Callable[[], Awaitable[Response]]) -> Response:
+        if self.mode == "passthrough":
+            return await request()
+        if (response := self.__lookup(key)) is not None:
+            return response
+
+        response = await request()
+        self.save(key, response)
+        return response
@@ -1,22 +1,52 @@
 import sys
 import random
-from openai import OpenAI
+import asyncio
 import io
 import base64
 import os
 import copy
+import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from PIL import Image
 from typing import List, Tuple, Dict
 from typing import Optional, Any, Self
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 sys.dont_write_bytecode = True
-from .manager import OBS
+from . import utils
+from .manager import OBS, Manager
 from .log import VirtualLog
+from .timing import Timing
+from .model import Content, TextContent, ImageContent, Message, Model
 from .agent import Agent, AIOAgent
 from .agent import PlannerAgent, GrounderAgent
-from .prompt import TypeSort, CodeLike
+from .prompt import TypeSort, CodeLike, UI_TARS_15_PROMPT
 from ui_tars_util import parse_action_to_structure_output, parsing_response_to_pyautogui_code
-import re
+
+# EXECUTOR_URL may list replicas of the executor separated by commas
+# one client per URL lives as long as the process, so that connections,
+# balancing and the circuit breaker are kept across steps and tasks
+EXECUTORS: Dict[str, Model] = {}
+EXECUTOR_NAME = "tars1.5-grounding"
+
+def executors() -> Model:
+    executor_url = os.environ["EXECUTOR_URL"]
+    if executor_url not in EXECUTORS:
+        base_urls = [
+            f"http://{url.split('//')[-1].split('/v1')[0]}/v1/chat/completions"
+            for url in executor_url.split(",")
+        ]
+        EXECUTORS.setdefault(executor_url, Model(
+            model_style="openai",
+            base_url=base_urls[0] if len(base_urls) == 1 else base_urls,
+            model_name=EXECUTOR_NAME,
+            api_key="empty",
+            max_tokens=None,
+            top_p=None,
+            temperature=1.
+        ))
+    return EXECUTORS[executor_url]
 
 @dataclass
 class Community:
@@ -31,6 +61,12 @@ class Community:
             if isinstance(getattr(self, key), Agent)
         ]
 
+    # a community with cloned agents for another worker
+    def clone(self) -> Self:
+        return replace(self, **{
+            name: agent.clone() for name, agent in self.agents
+        })
+
     def __iter__(self) -> Self:
         self.iter_pointer = 0
         return self
@@ -53,11 +89,20 @@ class Community:
     ) -> List[CodeLike]:
         raise NotImplementedError
 
+    # communities without native support hold a thread while waiting
+    async def acall(self, *args, **kwargs) -> List[CodeLike]:
+        return await asyncio.to_thread(self, *args, **kwargs)
+
 
 @dataclass
 class AllInOne(Community):
     mono: AIOAgent
 
+    def __post_init__(self):
+        super().__post_init__()
+        # fragment of UI-TARS prompt by system message of the task
+        self.tars_prompt: Optional[Tuple[Message, str]] = None
+
     def __call__(
         self,
         steps: Tuple[int, int],
@@ -67,7 +112,35 @@ class AllInOne(Community):
         type_sort: TypeSort,
         timeout: int
     ) -> List[CodeLike]:
-        step_index, total_steps = steps
+        user_content = self._request(steps, inst, obs, type_sort)
+        response_message = self.mono(user_content, timeout=timeout)
+        return self._respond(steps, code_info, response_message, timeout)
+
+    async def acall(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int
+    ) -> List[CodeLike]:
+        user_content = self._request(steps, inst, obs, type_sort)
+        response_message = await self.mono.acall(user_content, timeout=timeout)
+        # the planner calls the executor synchronously
+        if os.getenv('QWEN_PLANNER', '0') == '1':
+            return await asyncio.to_thread(self._respond, steps, code_info, response_message, timeout)
+        return self._respond(steps, code_info, response_message, timeout)
+
+    # contents of the user message to the model
+    def _request(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        type_sort: TypeSort
+    ) -> List[Content]:
+        step_index, _ = steps
         init_kwargs = {
             "inst": inst,
             "type_sort": type_sort
@@ -77,8 +150,42 @@ class AllInOne(Community):
         if os.getenv("TARS_DPO_NAME") == "ui-tars" or os.getenv('QWEN_VL', 0) == "1":
             tmp = user_content[0]
             del user_content[0]
-
-        response_message = self.mono(user_content, timeout=timeout)
+        return user_content
+
+    # the prompt of UI-TARS only changes with the task
+    def _tars_prompt(self) -> str:
+        system_message = self.mono.system_message
+        if self.tars_prompt is None or self.tars_prompt[0] is not system_message:
+            task = system_message.content[0].text.split('User Instruction\n')[1]
+            self.tars_prompt = (system_message, utils.dumps({
+                "role": "user",
+                "content": [{
+                    "type": "text",
+                    "text": UI_TARS_15_PROMPT.format(instruction=task, language='English')
+                }]
+            }))
+        return self.tars_prompt[1]
+
+    # the planner's history with its last thought for UI-TARS to act on
+    # messages in between are JSON fragments cached by the planner
+    def _tars_payload(self, thought: str) -> List[str]:
+        fragments = self.mono.dump_fragments(None)
+        return [self._tars_prompt(), *fragments[1:-1], utils.dumps({
+            "role": self.mono.context[-1].role,
+            "content": [{"type": "text", "text": thought + '\nAction: '}]
+        })]
+
+    # codes parsed from the response of the model
+    def _respond(
+        self,
+        steps: Tuple[int, int],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        response_message: Message,
+        timeout: int = Manager.HETERO_TIMEOUT
+    ) -> List[CodeLike]:
+        step_index, total_steps = steps
+        # ui-tars emits coordinates in the space of the image it sees
+        width, height = self.mono.image_size or (1280, 800)
         assert len(response_message.content) == 1
         if "CODER_CALL" in response_message.content[0].text:
             print("CALL")
@@ -100,47 +207,44 @@ class AllInOne(Community):
                 f"Planner Response {step_index + 1}/{total_steps}: \n" \
                 + response_message.content[0].text
             )
-            from sci.base.prompt import UI_TARS_15_PROMPT
-            task = self.mono.system_message.content[0].text.split('User Instruction\n')[1]
-            tars_prompt = UI_TARS_15_PROMPT.format(instruction=task, language='English')
-            payload = self.mono.dump_payload(None)
-            payload[0]['role'] = 'user'
-            payload[0]['content'][0]['text'] = tars_prompt
-            thought = payload[-1]['content'][0]['text'].split('\nAction')[0].strip('\n').strip()
-            payload[-1]['content'][0]['text'] = thought + '\nAction: '
+            thought = self.mono.context[-1].content[0].text.split('\nAction')[0].strip('\n').strip()
+            payload = self._tars_payload(thought)
+            executor = executors()
+            timing = self.vlog.timing
 
+            # executor outages and deadlines are left to Retry & Tester
+            # only responses failing to be parsed are requested again
             max_try_times = 3
-            try_times = 0
-            while try_times < max_try_times:
-                try:
-                    url = os.environ["EXECUTOR_URL"].split("//")[-1].split("/v1")[0]
-                    vlm = OpenAI(
-                        base_url=f"http://{url}/v1",
-                        api_key="empty",
-                    )
-                    response = vlm.chat.completions.create(
-                        model="tars1.5-grounding",
-                        messages=payload,
-                        temperature=1.,
-                    )
-                    action = response.choices[0].message.content.strip()
-                    response = f'{thought}\nAction: {action}'
-                    self.mono.context[-1].content[0].text = response
-                    response_message.content[0].text = response
-
-                    response_content = response_message.content[0]
-                    self.vlog.info(
-                        f"Actor Response {step_index + 1}/{total_steps}: \n" \
-                        + response_message.content[0].text
+            for try_times in range(max_try_times):
+                with timing(Timing.MODEL), timing.guard():
+                    response = executor(
+                        payload,
+                        timing.remaining(timeout),
+                        deadline=timing.deadline,
+                        log=self.vlog.warning
                     )
+                executed = executor.access(response, 0)
+                assert executed is not None, \
+                    f"Unexpected response of {EXECUTOR_NAME}.\n" + response.text
+                action = executed.content[0].text.strip()
+                response = f'{thought}\nAction: {action}'
+                self.mono.context[-1].content[0].text = response
+                response_message.content[0].text = response
+
+                response_content = response_message.content[0]
+                self.vlog.info(
+                    f"Actor Response {step_index + 1}/{total_steps}: \n" \
+                    + response_message.content[0].text
+                )
 
-                    parsed_responses = parse_action_to_structure_output(response_content.text, factor=1000, origin_resized_height=800, origin_resized_width=1280)
+                try:
+                    parsed_responses = parse_action_to_structure_output(response_content.text, factor=1000, origin_resized_height=height, origin_resized_width=width)
                     pyautogui_code_full = ""
                     if len(parsed_responses) == 1:
                         for parsed_response in parsed_responses:
                             pyautogui_code = parsing_response_to_pyautogui_code(
                                 responses=parsed_response,
-                                image_height=800, image_width=1280,
+                                image_height=height, image_width=width,
                                 input_swap=False
                             )
                             self.vlog.info(
@@ -155,7 +259,7 @@ class AllInOne(Community):
                         for parsed_response in parsed_responses:
                             pyautogui_code = parsing_response_to_pyautogui_code(
                                 responses=parsed_response,
-                                image_height=800, image_width=1280,
+                                image_height=height, image_width=width,
                                 input_swap=False
                             )
                             self.vlog.info(
@@ -173,12 +277,16 @@ class AllInOne(Community):
                         + response_content_clone.text
                 )
                     break
-                except:
-                    self.vlog.info(
+                except Exception:
+                    self.vlog.warning(
                         f"Actor Response Fail {try_times}: {step_index + 1}/{total_steps}: \n" \
-                        + action
+                        + action + "\n" + traceback.format_exc()
                     )
-                    try_times += 1
+            else:
+                raise ValueError(
+                    f"Failed to parse responses of {EXECUTOR_NAME} "
+                    f"after {max_try_times} attempts"
+                )
             return self.mono.code_handler(response_content_clone, *code_info)
 
         response_content = response_message.content[0]
@@ -188,12 +296,12 @@ class AllInOne(Community):
         )
 
         if os.getenv("TARS_DPO_NAME") == "ui-tars":
-            parsed_responses = parse_action_to_structure_output(response_content.text, factor=1000, origin_resized_height=800, origin_resized_width=1280)
+            parsed_responses = parse_action_to_structure_output(response_content.text, factor=1000, origin_resized_height=height, origin_resized_width=width)
             pyautogui_code_full = ""
             for parsed_response in parsed_responses:
                 pyautogui_code = parsing_response_to_pyautogui_code(
                     responses=parsed_response,
-                    image_height=800, image_width=1280,
+                    image_height=height, image_width=width,
                     input_swap=False
                 )
                 self.vlog.info(
@@ -215,37 +323,35 @@ class AllInOne(Community):
             return self.mono.code_handler(response_content_clone, *code_info)
 
         if os.getenv('QWEN_VL', 1) == "1":
-            action_str = response_content.text.split("Action:")[-1]
-            action_str = action_str.strip(';')
-            response_content_clone = copy.deepcopy(response_content)
-            response_content_clone.text = "```\n" +  action_str + "```"
-            return self.mono.code_handler(response_content_clone, *code_info)
+            return self.mono.code_handler(response_content, *code_info, code_style="qwen_vl")
         if os.getenv("REASONING", "0") == "1":
-            response_content_clone = copy.deepcopy(response_content)
-            raw_text = response_content.text
-            match = re.search(r"<code>(.*?)</code>", raw_text, re.DOTALL)
-            parsed_code = match.group(1).strip() if match else ""
-            response_content_clone.text = "```\n" +  parsed_code + "```"
+            codes = self.mono.code_handler(response_content, *code_info, code_style="reasoning")
             if os.getenv("SINGLE_STEP", "0") == "1":
+                parsed_code = codes[0].code
                 print(parsed_code)
                 if len(parsed_code.split('; ')) != 1:
-                    new_res = []
-                    for sub_code in parsed_code.split('; '):
-                        response_content_clone = copy.deepcopy(response_content)
-                        response_content_clone.text = "```\n" + sub_code + "```"
-                        single = self.mono.code_handler(response_content_clone, *code_info)
-                        new_res.append(single)
-                    return new_res
-            return self.mono.code_handler(response_content_clone, *code_info)
+                    return [
+                        [replace(codes[0], code=sub_code.strip(), action=None)]
+                        for sub_code in parsed_code.split('; ')
+                    ]
+            return codes
 
         # not reasoning and tars, original output.
         return self.mono.code_handler(response_content, *code_info)
 
 
+# pipelined if `pipeline` is set:
+# - the grounder is prepared while the planner is requested
+#   i.e. its system prompt at the first step and its contents
+#   with images encoded, leaving the schedule to be filled in
+# - preparation is cancelled if the planner gives special codes
+# - plans of several schedules are grounded concurrently
+#   by clones of the grounder, and codes are joined in order
 @dataclass
 class SeeAct(Community):
     planner: PlannerAgent
     grounder: GrounderAgent
+    pipeline: bool = False
 
     def __call__(
         self,
@@ -256,6 +362,9 @@ class SeeAct(Community):
         type_sort: TypeSort,
         timeout: int
     ) -> List[CodeLike]:
+        if self.pipeline:
+            return self.__pipelined(steps, inst, obs, code_info, type_sort, timeout)
+
         step_index, total_steps = steps
         first_step = step_index == 0
 
@@ -296,3 +405,146 @@ class SeeAct(Community):
                 + grounder_response_content.text
         )
         return self.grounder.code_handler(grounder_response_content, *code_info)
+
+    @staticmethod
+    def __init_kwargs(step_index: int, inst: str, type_sort: TypeSort) -> Optional[Dict]:
+        return {
+            "inst": inst,
+            "type_sort": type_sort
+        } if step_index == 0 else None
+
+    # PIL decodes images lazily, which is not thread-safe
+    # so images are decoded before the planner and the grounder share them
+    # set the event to skip what is left but initialization, e.g. on DONE
+    def _prepare(
+        self,
+        obs: Dict[str, Any],
+        init_kwargs: Optional[Dict]
+    ) -> Tuple[Future, threading.Event]:
+        for item in obs.values():
+            if isinstance(item, Image.Image):
+                item.load()
+
+        cancelled = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=1)
+        prepared = pool.submit(self.__prepare, obs, init_kwargs, cancelled)
+        # the thread exits once preparation is done
+        pool.shutdown(wait=False)
+        return prepared, cancelled
+
+    # contents of the grounder whose schedule is filled in by __schedule()
+    # None if cancelled before they are ready
+    def __prepare(
+        self,
+        obs: Dict[str, Any],
+        init_kwargs: Optional[Dict],
+        cancelled: threading.Event
+    ) -> Optional[List[Content]]:
+        if init_kwargs is not None:
+            self.grounder._init(frozenset(obs.keys()), **init_kwargs)
+        if cancelled.is_set():
+            return None
+        contents = self.grounder._step(obs | {OBS.schedule: None})
+        for content in contents:
+            if cancelled.is_set():
+                return None
+            if isinstance(content, ImageContent):
+                content.encode()
+        return contents
+
+    def __plan(
+        self,
+        steps: Tuple[int, int],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        planner_response_message: Message
+    ) -> List[CodeLike]:
+        step_index, total_steps = steps
+        assert len(planner_response_message.content) == 1
+        planner_response_content = planner_response_message.content[0]
+
+        self.vlog.info(
+            f"Response of planner {step_index + 1}/{total_steps}: \n" \
+                + planner_response_content.text
+        )
+        return self.planner.code_handler(planner_response_content, *code_info)
+
+    # extract_planner() gives a single description to be grounded
+    @staticmethod
+    def __schedule(contents: List[Content], schedule: str) -> List[Content]:
+        opening, *others = contents
+        return [
+            TextContent(opening.text, opening.args | {OBS.schedule: schedule}),
+            *others
+        ]
+
+    def __ground(
+        self,
+        steps: Tuple[int, int],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        grounder_response_message: Message
+    ) -> List[CodeLike]:
+        step_index, total_steps = steps
+        assert len(grounder_response_message.content) == 1
+        grounder_response_content = grounder_response_message.content[0]
+
+        self.vlog.info(
+            f"Response of grounder {step_index + 1}/{total_steps}: \n" \
+                + grounder_response_content.text
+        )
+        return self.grounder.code_handler(grounder_response_content, *code_info)
+
+    def __pipelined(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int
+    ) -> List[CodeLike]:
+        init_kwargs = SeeAct.__init_kwargs(steps[0], inst, type_sort)
+        prepared, cancelled = self._prepare(obs, init_kwargs)
+        planner_content = self.planner._step(obs, init_kwargs)
+        planner_response_message = self.planner(planner_content, timeout=timeout)
+        codes = self.__plan(steps, code_info, planner_response_message)
+
+        # to intercept special codes
+        # the grounder is still initialized for following steps
+        if codes[0].desc is False:
+            cancelled.set()
+            prepared.result()
+            return codes
+
+        obs[OBS.schedule] = codes[0].code
+        contents = SeeAct.__schedule(prepared.result(), codes[0].code)
+        return self.__ground(steps, code_info, self.grounder(contents, timeout=timeout))
+
+    async def acall(
+        self,
+        steps: Tuple[int, int],
+        inst: str,
+        obs: Dict[str, Any],
+        code_info: tuple[set[str], Optional[List[List[int]]]],
+        type_sort: TypeSort,
+        timeout: int
+    ) -> List[CodeLike]:
+        if not self.pipeline:
+            return await super().acall(steps, inst, obs, code_info, type_sort, timeout)
+
+        init_kwargs = SeeAct.__init_kwargs(steps[0], inst, type_sort)
+        prepared, cancelled = self._prepare(obs, init_kwargs)
+        planner_content = self.planner._step(obs, init_kwargs)
+        planner_response_message = await self.planner.acall(planner_content, timeout=timeout)
+        codes = self.__plan(steps, code_info, planner_response_message)
+
+        # to intercept special codes
+        # the grounder is still initialized for following steps
+        if codes[0].desc is False:
+            cancelled.set()
+            await asyncio.wrap_future(prepared)
+            return codes
+
+        obs[OBS.schedule] = codes[0].code
+        contents = SeeAct.__schedule(await asyncio.wrap_future(prepared), codes[0].code)
+        response = await self.grounder.acall(contents, timeout=timeout)
+        return self.__ground(steps, code_info, response)
@@ -0,0 +1,199 @@
+import sys
+import itertools
+import dataclasses
+
+from collections import deque
+from typing import Optional, List, Tuple, Dict, Union, Callable, Iterator
+
+from PIL import Image
+
+sys.dont_write_bytecode = True
+from .model import Content, TextContent, ImageContent, Message
+
+
+# how images older than the last `context_images` messages are sent
+# - drop: left out
+# - thumbnail: downscaled to THUMBNAIL on the longer side, in low detail
+# - caption: replaced by a line of text
+class History:
+    THUMBNAIL = 256
+    CAPTION = "(an earlier screenshot of {width}x{height} is omitted)"
+
+    @staticmethod
+    def drop(content: ImageContent) -> Optional[Content]:
+        return None
+
+    @staticmethod
+    def thumbnail(content: ImageContent) -> Optional[Content]:
+        image = content.image.copy()
+        image.thumbnail((History.THUMBNAIL, History.THUMBNAIL), Image.Resampling.LANCZOS)
+        return ImageContent(image, dataclasses.replace(content.policy, detail="low"))
+
+    @staticmethod
+    def caption(content: ImageContent) -> Optional[Content]:
+        width, height = content.image.size
+        return TextContent(History.CAPTION.format(width=width, height=height))
+
+
+# conversation of an agent kept in a ring buffer
+# - the oldest messages are dropped beyond `capacity` messages
+# - images of the oldest messages are dropped beyond `memory` bytes
+#   of raw pixels, while their texts are kept
+# - images are dropped as well beyond the last `retain` messages with them
+# - view() selects messages by reference instead of copying them
+class Context:
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        memory: Optional[int] = None,
+        retain: Optional[int] = None
+    ) -> None:
+        assert capacity is None or (isinstance(capacity, int) and capacity > 0)
+        self.capacity = capacity
+
+        assert memory is None or (isinstance(memory, int) and memory > 0)
+        self.memory = memory
+
+        assert retain is None or (isinstance(retain, int) and retain >= 0)
+        self.retain = retain
+
+        self.messages: deque[Message] = deque()
+        self.usage = 0
+        # messages with images in order, until released
+        self.imaged: deque[Message] = deque()
+        # reduced copies by id of originals
+        self.reduced: Dict[int, Tuple[Tuple, Message]] = {}
+
+    @staticmethod
+    def size(message: Message) -> int:
+        return sum(
+            content.image.width * content.image.height * len(content.image.getbands())
+            for content in message.content
+            if isinstance(content, ImageContent)
+        )
+
+    # texts are shared, so amendments in place are seen by both
+    @staticmethod
+    def reduce(
+        message: Message,
+        history: Callable[[ImageContent], Optional[Content]] = History.drop
+    ) -> Message:
+        content = []
+        for item in message.content:
+            if isinstance(item, ImageContent):
+                item = history(item)
+            if item is not None:
+                content.append(item)
+        return Message(
+            style=message.style,
+            role=message.role,
+            content=content or [TextContent(Content.PLACEHOLDER)],
+            context_window=message.context_window
+        )
+
+    @staticmethod
+    def strip(message: Message) -> Message:
+        return Context.reduce(message, History.drop)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.messages)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Message, List[Message]]:
+        if isinstance(index, slice):
+            return list(self.messages)[index]
+        return self.messages[index]
+
+    def __forget(self, message: Message) -> None:
+        self.usage -= Context.size(message)
+        self.reduced.pop(id(message), None)
+
+    def __release(self, message: Message) -> None:
+        self.usage -= Context.size(message)
+        self.reduced.pop(id(message), None)
+        message.content = Context.strip(message).content
+
+    def append(self, message: Message) -> None:
+        assert isinstance(message, Message)
+        # released before appending, so that a message popped
+        # right after, e.g. for retries, never costs one in history
+        if self.retain is not None:
+            while len(self.imaged) > self.retain:
+                self.__release(self.imaged.popleft())
+
+        if self.capacity is not None and len(self.messages) >= self.capacity:
+            self.__forget(evicted := self.messages.popleft())
+            if self.imaged and self.imaged[0] is evicted:
+                self.imaged.popleft()
+        self.messages.append(message)
+        if (size := Context.size(message)) > 0:
+            self.imaged.append(message)
+            self.usage += size
+
+        # the latest message is always kept as it is
+        if self.memory is not None and self.usage > self.memory:
+            for older in itertools.islice(self.messages, len(self.messages) - 1):
+                if Context.size(older) == 0:
+                    continue
+                self.__release(older)
+                if self.imaged and self.imaged[0] is older:
+                    self.imaged.popleft()
+                if self.usage <= self.memory:
+                    break
+
+    def pop(self) -> Message:
+        message = self.messages.pop()
+        self.__forget(message)
+        if self.imaged and self.imaged[-1] is message:
+            self.imaged.pop()
+        return message
+
+    def __reduced(
+        self,
+        message: Message,
+        history: Callable[[ImageContent], Optional[Content]]
+    ) -> Message:
+        signature = (history, *(id(content) for content in message.content))
+        cached = self.reduced.get(id(message))
+        if cached is None or cached[0] != signature:
+            cached = (signature, Context.reduce(message, history))
+            self.reduced[id(message)] = cached
+        return cached[1]
+
+    # the last `count` messages, where
+    # - messages of `drop` role are left out, except for the last `keep`
+    # - images are sent as they are in the last `images` messages with them
+    #   then through `history` in `reduced` messages more, then left out
+    def view(
+        self,
+        count: int,
+        drop: Optional[str] = None,
+        keep: int = 0,
+        images: Optional[int] = None,
+        history: Callable[[ImageContent], Optional[Content]] = History.drop,
+        reduced: Optional[int] = None
+    ) -> List[Message]:
+        assert count >= 0 and keep >= 0
+        selected = list(itertools.islice(reversed(self.messages), count))
+        selected.reverse()
+
+        view = []
+        for index, message in enumerate(selected):
+            if drop is not None and index < len(selected) - keep and message.role == drop:
+                continue
+            view.append(message)
+
+        if images is not None:
+            for index in range(len(view) - 1, -1, -1):
+                if not any(isinstance(content, ImageContent) for content in view[index].content):
+                    continue
+                if images > 0:
+                    images -= 1
+                elif reduced is None or reduced > 0:
+                    reduced = None if reduced is None else reduced - 1
+                    view[index] = self.__reduced(view[index], history)
+                else:
+                    view[index] = self.__reduced(view[index], History.drop)
+        return view
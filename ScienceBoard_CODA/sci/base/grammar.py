@@ -0,0 +1,201 @@
+import sys
+import re
+import json
+
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict, Any
+from typing import Callable, ClassVar, Literal
+
+sys.dont_write_bytecode = True
+
+ActionKind = Literal["code", "click", "type", "scroll"]
+
+
+# an action parsed out of a response of models
+# - code: a snippet kept as it is, e.g. of pyautogui or primitives
+# - click: coordinates relative to the screen, in [0, 1]
+# - type: text to be typed
+# - scroll: one of UP, DOWN, LEFT and RIGHT
+# span is where the action is found in the response
+# not frozen, as actions are created on each chunk of streams
+@dataclass
+class Action:
+    kind: ActionKind
+    value: Any
+    span: Tuple[int, int] = (0, 0)
+
+    SCROLL: ClassVar[Dict[str, str]] = {
+        "UP": "pyautogui.scroll(10)",
+        "DOWN": "pyautogui.scroll(-10)",
+        "LEFT": "pyautogui.hscroll(-10)",
+        "RIGHT": "pyautogui.hscroll(10)"
+    }
+
+    # code to be executed by Manager
+    def render(self) -> str:
+        if self.kind == "code":
+            return self.value
+        if self.kind == "click":
+            return f"pyautogui.click({self.value[0]}, {self.value[1]})"
+        if self.kind == "type":
+            return f"pyautogui.typewrite({json.dumps(self.value)}, interval=0.1)"
+        return Action.SCROLL[self.value]
+
+
+# a pattern and a factory of its builder
+# given indexes of groups of the rule by field, e.g. {"x": 1, "y": 2}
+Builder = Callable[[re.Match], Action]
+Rule = Tuple[str, Callable[[Dict[str, int]], Builder]]
+
+
+# rules of a grammar are compiled into one alternation once
+# so that a response is scanned in a single pass however many rules there are
+# - at each position, rules are tried in order
+# - groups of rules are named with the rule as prefix, e.g. click_x
+#   a match is told apart by its last group, instead of a group around
+#   each rule, which keeps re from skipping to the first chars of rules
+# - `fallback` builds the action of a response that no rule matches
+#   which is not taken as complete, see complete()
+# - `first` keeps only the first action found
+# - `fenced`: codes holding ``` blocks are split into codes of the blocks
+# - `literal`: a string held by any match, so that texts without it
+#   are not scanned at all, as in is much cheaper than re
+class Grammar:
+    FENCE = re.compile(r'^```\w*\s*|\s*```$')
+
+    def __init__(
+        self,
+        rules: Dict[str, Rule],
+        fallback: Optional[Callable[[str], Action]] = None,
+        first: bool = False,
+        fenced: bool = False,
+        literal: Optional[str] = None
+    ) -> None:
+        assert len(rules) > 0
+        self.pattern = re.compile("|".join([
+            f"(?:{pattern})" for pattern, _ in rules.values()
+        ]))
+
+        self.builders: Dict[int, Builder] = {}
+        for name, (_, factory) in rules.items():
+            groups = {
+                group[len(name) + 1:]: index
+                for group, index in self.pattern.groupindex.items()
+                if group.startswith(name + "_")
+            }
+            assert len(groups) > 0, f"Rule {name} has no named group"
+            builder = factory(groups)
+            self.builders |= {index: builder for index in groups.values()}
+        # no need to tell rules apart if only one
+        self.builder = builder if len(rules) == 1 else None
+
+        self.fallback = fallback
+        self.first = first
+        self.fenced = fenced
+        self.literal = literal
+        self.search = self.pattern.search
+        self.finditer = self.pattern.finditer
+
+    def __call__(self, text: str) -> List[Action]:
+        if self.literal is not None and self.literal not in text:
+            if self.fallback is None:
+                return []
+            matches = ()
+        elif self.first:
+            matches = [] if (match := self.search(text)) is None else [match]
+        else:
+            matches = self.finditer(text)
+
+        if (builder := self.builder) is not None:
+            actions = [builder(match) for match in matches]
+        else:
+            builders = self.builders
+            actions = [builders[match.lastindex](match) for match in matches]
+        if len(actions) == 0 and self.fallback is not None:
+            actions.append(self.fallback(text))
+        if self.fenced:
+            actions = [
+                unfenced
+                for action in actions
+                for unfenced in Grammar.unfence(action)
+            ]
+        return actions
+
+    # whether any rule matches, without building actions
+    # e.g. for each chunk of a streamed completion
+    def complete(self, text: str) -> bool:
+        if self.literal is not None and self.literal not in text:
+            return False
+        return self.search(text) is not None
+
+    # e.g. Action: ```python\npyautogui.click(0.1, 0.2)\n```
+    # a fence left open by a truncated response is dropped as well
+    @staticmethod
+    def unfence(action: Action) -> List[Action]:
+        if action.kind != "code" or "```" not in action.value:
+            return [action]
+        blocks = ANTIQUOT(action.value)
+        for block in blocks:
+            block.span = action.span
+        return blocks or [
+            Action("code", Grammar.FENCE.sub("", action.value), action.span)
+        ]
+
+    @staticmethod
+    def code(strip: str = "") -> Callable[[Dict[str, int]], Builder]:
+        def factory(groups: Dict[str, int]) -> Builder:
+            code = groups["code"]
+            if strip:
+                return lambda match: Action("code", match[code].strip(strip).strip(), match.span())
+            return lambda match: Action("code", match[code].strip(), match.span())
+        return factory
+
+    @staticmethod
+    def click(groups: Dict[str, int]) -> Builder:
+        x, y = groups["x"], groups["y"]
+        return lambda match: Action(
+            "click",
+            (int(match[x]) / 1000, int(match[y]) / 1000),
+            match.span()
+        )
+
+    @staticmethod
+    def type(groups: Dict[str, int]) -> Builder:
+        text = groups["text"]
+        return lambda match: Action("type", match[text], match.span())
+
+    @staticmethod
+    def scroll(groups: Dict[str, int]) -> Builder:
+        direction = groups["direction"]
+        return lambda match: Action("scroll", match[direction], match.span())
+
+    @staticmethod
+    def whole(text: str, strip: str = "") -> Action:
+        return Action(kind="code", value=text.strip(strip).strip(), span=(0, len(text)))
+
+
+# grammars by code_style of Agent, see CodeLike.extract_*()
+# qwen_vl and reasoning parse responses of AllInOne
+ANTIQUOT = Grammar({
+    "antiquot": (r'```(?:\w*\s+)?(?P<antiquot_code>[\w\W]*?)```', Grammar.code())
+}, literal="```")
+
+GRAMMARS: Dict[str, Grammar] = {
+    "antiquot": ANTIQUOT,
+    "planner": ANTIQUOT,
+    "atlas": Grammar({
+        "click": (r'CLICK <point>\[\[(?P<click_x>\d+), ?(?P<click_y>\d+)\]\]</point>', Grammar.click),
+        "type": (r'TYPE \[(?P<type_text>.+?)\]', Grammar.type),
+        "scroll": (r'SCROLL \[(?P<scroll_direction>UP|DOWN|LEFT|RIGHT)\]', Grammar.scroll)
+    }),
+    "uground": Grammar({
+        "click": (r'\((?P<click_x>\d+), ?(?P<click_y>\d+)\)', Grammar.click)
+    }, literal="("),
+    # whatever follows the last "Action:", or the whole text
+    "qwen_vl": Grammar({
+        "action": (r'Action:(?![\w\W]*Action:)(?P<action_code>[\w\W]*)', Grammar.code(";"))
+    }, fallback=lambda text: Grammar.whole(text, ";"), first=True, fenced=True, literal="Action:"),
+    "reasoning": Grammar({
+        "reasoning": (r'<code>(?P<reasoning_code>[\w\W]*?)</code>', Grammar.code())
+    }, fallback=lambda text: Action(kind="code", value=""), first=True, fenced=True, literal="<code>")
+}
@@ -0,0 +1,158 @@
+import sys
+import os
+import json
+import time
+import threading
+
+from typing import Optional, Dict, Any
+
+sys.dont_write_bytecode = True
+from .log import Log, VirtualLog
+
+# fcntl is only available under UNIX-like OSs
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# append-only record of finished attempts under logs_path
+# - one JSON object per line, the last record of an ident wins
+# - lines are appended under an exclusive lock, so that
+#   workers of one process or of several processes can share it
+# - result.out is still written by Log for other tools
+class Journal:
+    FILENAME = "journal.jsonl"
+
+    PASS = "pass"
+    FAIL = "fail"
+    SKIP = "skip"
+    OUTCOMES = (PASS, FAIL, SKIP)
+
+    def __init__(self, logs_path: str) -> None:
+        assert isinstance(logs_path, str)
+        os.makedirs(logs_path, exist_ok=True)
+        self.logs_path = logs_path
+        self.path = os.path.join(logs_path, Journal.FILENAME)
+
+        self.vlog = VirtualLog()
+        self.lock = threading.Lock()
+        self.records: Dict[str, Dict[str, Any]] = {}
+
+        if not os.path.exists(self.path):
+            self.__migrate()
+        self.__read()
+
+    @staticmethod
+    def key(ident: str) -> str:
+        return ident.replace("\\", "/")
+
+    def __read(self) -> None:
+        with open(self.path, mode="r", encoding="utf-8") as readable:
+            for line in readable:
+                try:
+                    record = json.loads(line)
+                    self.records[record["ident"]] = record
+                except Exception:
+                    # a line might be truncated by a killed process
+                    continue
+
+    # logs written before the journal existed are probed only once
+    def __migrate(self) -> None:
+        records = []
+        for dir_path, _, filenames in os.walk(self.logs_path):
+            if Log.RESULT_FILENAME not in filenames:
+                continue
+            result_path = os.path.join(dir_path, Log.RESULT_FILENAME)
+            with open(result_path, mode="r", encoding="utf-8") as readable:
+                passed = readable.read().strip() == "1"
+            records.append(self.__record(
+                ident=os.path.relpath(dir_path, self.logs_path),
+                outcome=Journal.PASS if passed else Journal.FAIL,
+                started=os.path.getmtime(result_path)
+            ))
+        self.__append(records)
+
+    def __record(
+        self,
+        ident: str,
+        outcome: str,
+        stop_type: Optional[str] = None,
+        steps: Optional[int] = None,
+        started: Optional[float] = None,
+        duration: Optional[float] = None
+    ) -> Dict[str, Any]:
+        assert outcome in Journal.OUTCOMES
+        return {
+            "ident": Journal.key(ident),
+            "outcome": outcome,
+            "stop_type": stop_type,
+            "steps": steps,
+            "started": started,
+            "duration": duration
+        }
+
+    def __append(self, records) -> None:
+        data = "".join([
+            json.dumps(record, ensure_ascii=False) + "\n"
+            for record in records
+        ]).encode("utf-8")
+
+        # O_APPEND keeps each write at the end of file
+        # and flock serializes writers of different processes
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def record(
+        self,
+        ident: str,
+        outcome: str,
+        stop_type: Optional[str] = None,
+        steps: Optional[int] = None,
+        started: Optional[float] = None
+    ) -> None:
+        record = self.__record(
+            ident=ident,
+            outcome=outcome,
+            stop_type=stop_type,
+            steps=steps,
+            started=started,
+            duration=None if started is None else time.time() - started
+        )
+        with self.lock:
+            try:
+                self.__append([record])
+            except Exception as err:
+                self.vlog.fallback().error(
+                    f"Journal cannot be appended at {self.path}: {err}"
+                )
+            self.records[record["ident"]] = record
+
+    def get(self, ident: str) -> Optional[Dict[str, Any]]:
+        return self.records.get(Journal.key(ident))
+
+    # skipped attempts are not regarded as finished
+    def finished(self, ident: str) -> bool:
+        record = self.get(ident)
+        return record is not None \
+            and record["outcome"] in (Journal.PASS, Journal.FAIL)
+
+    # latest outcome of all idents, keyed by the fields of Counter
+    def totals(self) -> Dict[str, int]:
+        fields = {
+            Journal.PASS: "passed",
+            Journal.FAIL: "failed",
+            Journal.SKIP: "skipped"
+        }
+        totals = {field: 0 for field in fields.values()}
+        with self.lock:
+            for record in self.records.values():
+                totals[fields[record["outcome"]]] += 1
+        return totals
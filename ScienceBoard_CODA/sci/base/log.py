@@ -14,6 +14,8 @@ from typing import Callable, Self, TYPE_CHECKING
 from PIL import Image
 from PIL import Image, ImageFont, ImageDraw
 
+from .timing import Timing
+
 if TYPE_CHECKING:
     from .task import Task
     from .agent import CodeLike
@@ -87,6 +89,7 @@ class Log:
     REQUEST_FILENAME = "request_{agent}.json"
     SIMP_FILENAME    = "request_{agent}.simp.json"
     PROMPT_FILENAME  = "prompt_{agent}.txt"
+    TIMING_FILENAME  = "timing.json"
 
     @property
     def save_path(self) -> Optional[str]:
@@ -128,6 +131,11 @@ class Log:
         assert self.file_handler is not None
         return os.path.join(self.save_path, self.PROMPT_FILENAME)
 
+    @property
+    def timing_file_path(self) -> str:
+        assert self.file_handler is not None
+        return os.path.join(self.save_path, self.TIMING_FILENAME)
+
     def __init__(
         self,
         level: int = logging.INFO,
@@ -165,6 +173,8 @@ class Log:
         self._registered = []
         self._independent = []
         self.register_callback = None
+        self.finished = False
+        self.timing = Timing()
 
         global GLOBAL_VLOG
         if global_vlog or (global_vlog is None and GLOBAL_VLOG.is_none()):
@@ -179,7 +189,11 @@ class Log:
     @staticmethod
     def replace_ansi(file_path: str) -> Callable[["Log"], None]:
         def handler(self: Log) -> None:
-            log_content = open(file_path, mode="r", encoding="utf-8").read()
+            # log of a retried task might have been marked as legacy
+            try:
+                log_content = open(file_path, mode="r", encoding="utf-8").read()
+            except FileNotFoundError:
+                return
             with open(file_path, mode="w", encoding="utf-8") as writable:
                 writable.write(re.sub(self.ANSI_ESCAPE, "", log_content))
         return handler
@@ -283,8 +297,9 @@ class Log:
         )
 
     def __clear(self, ignore: bool) -> bool:
-        if os.path.exists(self.result_file_path) and ignore:
+        if self.finished and ignore:
             return
+        self.finished = False
 
         for filename in os.listdir(self.save_path):
             file_path = os.path.join(self.save_path, filename)
@@ -310,7 +325,8 @@ class Log:
         base_path: str,
         ident: Optional[str] = None,
         callback: bool = False,
-        ignore: bool = True
+        ignore: bool = True,
+        finished: Optional[bool] = None
     ) -> Self:
         assert self.register_callback == None, (
             "__call__() should not be called twice "
@@ -324,15 +340,22 @@ class Log:
         self.trigger(os.path.join(base_path, ident))
         self.extra["domain"] = self.DEFAULT_DOMAIN if ident is None else ident
 
+        # pass `finished` if it is known (e.g. from Journal)
+        # to avoid probing result file again
+        assert finished is None or isinstance(finished, bool)
+        self.finished = os.path.exists(self.result_file_path) \
+            if finished is None else finished
+
         assert isinstance(ignore, bool)
         self.__clear(ignore)
 
         assert isinstance(callback, bool)
         self.register_callback = callback
+        self.timing.reset()
         return self
 
     def __enter__(self) -> bool:
-        return os.path.exists(self.result_file_path)
+        return self.finished
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         assert isinstance(self.register_callback, bool)
@@ -340,6 +363,17 @@ class Log:
             self.callback()
         self.register_callback = None
 
+        # timing of the task is written next to its traj
+        if self.file_handler is not None and len(self.timing.spans) > 0:
+            try:
+                Timing.dump(
+                    self.timing_file_path,
+                    spans=self.timing.spans,
+                    summary=Timing.summary(self.timing.samples())
+                )
+            except Exception as err:
+                self.error(f"Timing cannot be saved: {err}")
+
         self.__remove_file_handler()
         self.extra["domain"] = self.DEFAULT_DOMAIN
 
@@ -600,9 +634,10 @@ class Log:
     def record_handler(method: Callable) -> Callable:
         def record_wrapper(self: "Task") -> bool:
             self.manager.record_start()
-            return_value = method(self)
-            self.manager.record_stop(self.vlog.record_file_path)
-            return return_value
+            try:
+                return method(self)
+            finally:
+                self.manager.record_stop(self.vlog.record_file_path)
         return record_wrapper
 
     # use log.info() directly instead of self.adapter.info()
@@ -650,6 +685,11 @@ class VirtualLog:
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self()
 
+    # timing of a nil vlog is recorded nowhere
+    @property
+    def timing(self) -> Timing:
+        return Timing() if self._log is None else self._log.timing
+
     # use vlog.fallback() when vlog might be nil
     # use GLOBAL_VLOG directly when vlog must be nil
     def fallback(self) -> "VirtualLog":
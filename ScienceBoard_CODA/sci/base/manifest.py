@@ -0,0 +1,124 @@
+import sys
+import os
+import json
+import tempfile
+import threading
+
+from typing import Optional, Tuple, Dict, Any, Callable
+
+sys.dont_write_bytecode = True
+from .log import VirtualLog
+from .utils import TypeSort
+
+
+# on-disk index of task configs under tasks_path
+# - entries are keyed by relative path and validated by mtime & size
+# - only changed configs are parsed again by json
+# - entries of removed configs are dropped on save()
+class Manifest:
+    FILENAME = ".manifest.json"
+    VERSION = 1
+
+    def __init__(
+        self,
+        tasks_path: str,
+        manifest_path: Optional[str] = None
+    ) -> None:
+        assert isinstance(tasks_path, str)
+        assert os.path.isdir(tasks_path)
+        self.tasks_path = tasks_path
+
+        if manifest_path is None:
+            manifest_path = os.path.join(tasks_path, Manifest.FILENAME)
+        assert isinstance(manifest_path, str)
+        self.path = os.path.expanduser(manifest_path)
+
+        self.vlog = VirtualLog()
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self.__read()
+        self.visited = set()
+        self.dirty = False
+
+    def __read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as readable:
+                manifest = json.load(readable)
+            assert manifest["version"] == Manifest.VERSION
+            return manifest["entries"]
+        except Exception:
+            return {}
+
+    def __key(self, config_path: str) -> str:
+        return os.path.relpath(config_path, self.tasks_path).replace("\\", "/")
+
+    # return parsed config and its type_sort
+    # use `validate` to check config before it is recorded
+    def __call__(
+        self,
+        config_path: str,
+        validate: Optional[Callable[[Dict[str, Any]], TypeSort]] = None
+    ) -> Tuple[Dict[str, Any], TypeSort]:
+        key = self.__key(config_path)
+        stat = os.stat(config_path)
+
+        with self.lock:
+            self.visited.add(key)
+            entry = self.entries.get(key)
+
+        if entry is not None \
+            and entry["mtime"] == stat.st_mtime_ns \
+            and entry["size"] == stat.st_size:
+            type_sort = TypeSort(
+                entry["type"],
+                TypeSort.Sort._member_map_[entry["sort"]]
+            )
+            return entry["config"], type_sort
+
+        with open(config_path, mode="r", encoding="utf-8") as readable:
+            config = json.load(readable)
+        type_sort = validate(config) if validate is not None else TypeSort(
+            config["type"],
+            TypeSort.Sort._member_map_[config["sort"]]
+        )
+
+        with self.lock:
+            self.entries[key] = {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "type": type_sort.type,
+                "sort": type_sort.sort.name,
+                "config": config
+            }
+            self.dirty = True
+        return config, type_sort
+
+    # write atomically so that concurrent readers never see half a file
+    def save(self) -> bool:
+        with self.lock:
+            stale = [
+                key for key in set(self.entries.keys()) - self.visited
+                if not os.path.exists(os.path.join(self.tasks_path, key))
+            ]
+            if not self.dirty and len(stale) == 0:
+                return True
+            for key in stale:
+                del self.entries[key]
+
+            try:
+                fd, temp_path = tempfile.mkstemp(
+                    dir=os.path.split(self.path)[0],
+                    prefix=Manifest.FILENAME
+                )
+                with os.fdopen(fd, mode="w", encoding="utf-8") as writable:
+                    json.dump({
+                        "version": Manifest.VERSION,
+                        "entries": self.entries
+                    }, writable, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+                self.dirty = False
+                return True
+            except Exception as err:
+                self.vlog.fallback().warning(
+                    f"Manifest cannot be saved to {self.path}: {err}"
+                )
+                return False
@@ -1,14 +1,19 @@
 import sys
+import json
+import asyncio
 import string
 import base64
+import hashlib
 import time
+import threading
 import requests
 from requests import RequestException, Response
+from requests.adapters import HTTPAdapter
 from dataclasses import dataclass, field
 from io import BytesIO
-import io
-from typing import Optional, List, Dict
-from typing import Literal, Any, ClassVar
+from typing import Optional, Union, List, Dict, Tuple
+from typing import Literal, Any, ClassVar, Callable
+from collections import OrderedDict
 
 from PIL import Image
 
@@ -19,6 +24,9 @@ import os
 sys.dont_write_bytecode = True
 from . import utils
 from .manager import OBS
+from .cache import ResponseCache
+from .balancer import Balancer
+from .retry import Retry, Breaker
 from .override import *
 
 ModelType = Literal["openai", "anthropic"]
@@ -79,14 +87,135 @@ class TextContent(Content):
         }
 
 
+# LRU of base64 payloads shared by all ImageContent
+# bounded by total length of payloads in bytes
+class EncodingCache:
+    LIMIT = 128 * 1024 * 1024
+
+    def __init__(self, limit: int = LIMIT) -> None:
+        assert isinstance(limit, int) and limit >= 0
+        self.limit = limit
+        self.size = 0
+        self.entries: OrderedDict[Tuple, str] = OrderedDict()
+        # keys being encoded, e.g. the screenshot shared by SeeAct agents
+        self.pending: Dict[Tuple, threading.Event] = {}
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def __call__(self, key: Tuple, encode: Callable[[], str]) -> str:
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+                if (pending := self.pending.get(key)) is None:
+                    self.misses += 1
+                    self.pending[key] = threading.Event()
+                    break
+            # wait for the one encoding it, then look up again
+            pending.wait()
+
+        # encode out of lock
+        try:
+            value = encode()
+            with self.lock:
+                if key not in self.entries and len(value) <= self.limit:
+                    self.entries[key] = value
+                    self.size += len(value)
+                    while self.size > self.limit:
+                        _, evicted = self.entries.popitem(last=False)
+                        self.size -= len(evicted)
+        finally:
+            with self.lock:
+                self.pending.pop(key).set()
+        return value
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits, self.misses = 0, 0
+
+
+ENCODING_CACHE = EncodingCache()
+
+
+# how images are encoded before sent to models
+# - quality only applies to JPEG / WEBP
+# - the longer side is downscaled to max_side if exceeded
+# - coordinates from models are in the space of downscaled images
+#   and Task maps them back to the screen, see relative.py
+@dataclass(frozen=True)
+class ImagePolicy:
+    format: Literal["PNG", "JPEG", "WEBP"] = "PNG"
+    quality: Optional[int] = None
+    max_side: Optional[int] = None
+    grayscale: bool = False
+    detail: str = "high"
+
+    def __post_init__(self) -> None:
+        assert self.format in ("PNG", "JPEG", "WEBP")
+        assert self.quality is None or 0 < self.quality <= 100
+        assert self.max_side is None or self.max_side > 0
+        assert isinstance(self.grayscale, bool)
+
+    @property
+    def mime(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    def size(self, size: Tuple[int, int]) -> Tuple[int, int]:
+        width, height = size
+        if self.max_side is None or max(size) <= self.max_side:
+            return width, height
+        ratio = self.max_side / max(size)
+        return max(round(width * ratio), 1), max(round(height * ratio), 1)
+
+    def __call__(self, image: Image.Image) -> bytes:
+        if (size := self.size(image.size)) != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        if self.grayscale:
+            image = image.convert("L")
+        elif self.format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        options = {} if self.format == "PNG" or self.quality is None \
+            else {"quality": self.quality}
+        image.save(buffered:=BytesIO(), format=self.format, **options)
+        return buffered.getvalue()
+
+
 @dataclass
 class ImageContent(Content):
     image: Image.Image
+    policy: ImagePolicy = field(default_factory=ImagePolicy)
+    # images are regarded as immutable once wrapped
+    _digest: Optional[str] = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False
+    )
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            hasher.update(f"{self.image.mode}{self.image.size}".encode())
+            hasher.update(self.image.tobytes())
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    def encode(self, policy: Optional[ImagePolicy] = None) -> str:
+        policy = self.policy if policy is None else policy
+        return ENCODING_CACHE(
+            (self.digest, policy),
+            lambda: base64.b64encode(policy(self.image)).decode()
+        )
 
     @property
     def base64_png(self):
-        self.image.save(buffered:=BytesIO(), format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+        return self.encode(ImagePolicy())
 
     def _openai(self, hide_image: bool = False, **_) -> Dict[str, Any]:
         return {
@@ -94,9 +223,9 @@ class ImageContent(Content):
             "image_url": {
                 "url": (
                     Content.PLACEHOLDER if hide_image \
-                        else f"data:image/png;base64,{self.base64_png}"
+                        else f"data:{self.policy.mime};base64,{self.encode()}"
                 ),
-                "detail": "high"
+                "detail": self.policy.detail
             }
         }
 
@@ -105,8 +234,8 @@ class ImageContent(Content):
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
-                "data": Content.PLACEHOLDER if hide_image else self.base64_png
+                "media_type": self.policy.mime,
+                "data": Content.PLACEHOLDER if hide_image else self.encode()
             }
         }
 
@@ -118,6 +247,13 @@ class Message:
     role: RoleType
     content: List[Content]
     context_window: Optional[int] = None
+    # JSON fragments by options of _asdict()
+    _fragments: Dict[Tuple, Tuple[Tuple, str]] = field(
+        default_factory=dict,
+        init=False,
+        repr=False,
+        compare=False
+    )
 
     def _asdict(
         self,
@@ -145,11 +281,87 @@ class Message:
     def __dict_factory_override__(self) -> Dict[str, Any]:
         return self._asdict()
 
+    # messages are not rebuilt once they enter the context
+    # but texts may be amended in place, e.g. by AllInOne
+    # so the fragment is reused only if contents are unchanged
+    def dumps(
+        self,
+        show_context: bool = False,
+        hide_text: bool = False,
+        hide_image: bool = False
+    ) -> str:
+        options = (show_context, hide_text, hide_image)
+        signature = (self.context_window, *[
+            (id(content), getattr(content, "text", None))
+            for content in self.content
+        ])
+
+        cached = self._fragments.get(options)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        fragment = utils.dumps(self._asdict(*options))
+        self._fragments[options] = (signature, fragment)
+        return fragment
+
+
+# chunks of a streamed chat completion in OpenAI style
+# folded into one response as if it were not streamed
+# so that cache, overflow handlers and access() stay the same
+class Completion:
+    PREFIX = "data:"
+    DONE = "[DONE]"
+
+    def __init__(self, until: Optional[Callable[[str], bool]] = None) -> None:
+        self.until = until
+        self.text = ""
+        self.role = "assistant"
+        self.finish_reason: Optional[str] = None
+        self.cut = False
+
+    # return True if no more lines are needed
+    def feed(self, line: str) -> bool:
+        if not line.startswith(Completion.PREFIX):
+            return False
+        data = line[len(Completion.PREFIX):].strip()
+        if data == Completion.DONE:
+            return True
+
+        # chunks of usage carry no choice
+        for choice in json.loads(data).get("choices", []):
+            delta = choice.get("delta", {})
+            self.role = delta.get("role") or self.role
+            self.text += delta.get("content") or ""
+            self.finish_reason = choice.get("finish_reason") or self.finish_reason
+
+        if self.finish_reason is not None:
+            return True
+        if self.until is not None and self.until(self.text):
+            self.cut, self.finish_reason = True, "stop"
+            return True
+        return False
+
+    def __call__(self, received: Response) -> Response:
+        return Model._response(
+            status_code=received.status_code,
+            headers={"Content-Type": "application/json"},
+            url=received.url,
+            content=utils.dumps({
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": self.role, "content": self.text},
+                    "finish_reason": self.finish_reason
+                }]
+            }).encode("utf-8")
+        )
+
 
 @dataclass
 class Model:
     model_style: ModelType
-    base_url: str
+    # requests are balanced over replicas if a list is given
+    base_url: Union[str, List[str]]
     model_name: str
     api_key: Optional[str] = None
     proxy: Optional[str] = None
@@ -157,6 +369,51 @@ class Model:
     max_tokens: Optional[int] = 1500
     top_p: Optional[float] = 0.9
     temperature: Optional[float] = 1.0
+    # max keep-alive connections kept for the endpoint
+    pool_size: int = 16
+    # stream completions of openai style, and stop generation early
+    # once the text so far satisfies `until` passed to __call__()
+    stream: bool = False
+    image_policy: ImagePolicy = field(default_factory=ImagePolicy)
+    # responses are recorded / replayed if set
+    cache: Optional[ResponseCache] = field(default=None, compare=False)
+    retry: Retry = field(default_factory=Retry)
+    # shared by agents cloned from one another
+    breaker: Breaker = field(default_factory=Breaker, repr=False, compare=False)
+
+    # one session per process, shared by threads of workers
+    _session: Optional[Tuple[int, requests.Session]] = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False
+    )
+    SESSION_LOCK: ClassVar[threading.Lock] = threading.Lock()
+    _async_client: Optional[Tuple[asyncio.AbstractEventLoop, Any]] = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False
+    )
+    balancer: Optional[Balancer] = field(
+        default=None,
+        init=False,
+        repr=False,
+        compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if isinstance(self.base_url, list):
+            self.balancer = Balancer(
+                self.base_url,
+                probe=Model._probe,
+                proxies=self.proxies
+            )
+
+    # replicas are probed by listing models, which costs no generation
+    @staticmethod
+    def _probe(endpoint: str) -> str:
+        return f"{endpoint.split('/v1')[0]}/v1/models"
 
     def message(
         self,
@@ -172,7 +429,143 @@ class Model:
             "https": self.proxy
         }
 
-    def _request_openai(self, messages: Dict, timeout: int) -> Response:
+    # sockets are not reused after fork
+    @property
+    def session(self) -> requests.Session:
+        with Model.SESSION_LOCK:
+            if self._session is None or self._session[0] != os.getpid():
+                assert isinstance(self.pool_size, int) and self.pool_size > 0
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = (os.getpid(), session)
+            return self._session[1]
+
+    # messages of str are fragments dumped by Message.dumps()
+    # they are spliced into the body instead of serialized again
+    @staticmethod
+    def _body(payload: Dict[str, Any], messages: List) -> Dict[str, Any]:
+        if not all(isinstance(message, str) for message in messages):
+            return {"json": payload | {"messages": messages}}
+
+        head = utils.dumps(payload)[:-1]
+        body = head + ("," if len(payload) > 0 else "") \
+            + '"messages":[' + ",".join(messages) + "]}"
+        return {"data": body.encode("utf-8")}
+
+    @staticmethod
+    def _response(
+        status_code: int,
+        headers: Dict[str, str],
+        url: str,
+        content: bytes
+    ) -> Response:
+        response = Response()
+        response.status_code = status_code
+        response.headers.update(headers)
+        response.url = str(url)
+        response.encoding = "utf-8"
+        response._content = content
+        return response
+
+    # closing an unfinished stream aborts the generation
+    def _stream(
+        self,
+        timeout: int,
+        until: Callable[[str], bool],
+        **kwargs
+    ) -> Response:
+        received = self._post(timeout, stream=True, **kwargs)
+        if received.status_code != 200:
+            received.content
+            return received
+
+        received.encoding = "utf-8"
+        completion = Completion(until)
+        try:
+            for line in received.iter_lines(decode_unicode=True):
+                if completion.feed(line):
+                    break
+        finally:
+            received.close()
+        return completion(received)
+
+    # server errors count against the replica as well
+    def _post(self, timeout: int, **kwargs) -> Response:
+        post = lambda url: self.session.post(
+            url,
+            proxies=self.proxies,
+            timeout=timeout,
+            **kwargs
+        )
+        if self.balancer is None:
+            return post(self.base_url)
+        return self.balancer(post, lambda response: response.status_code < 500)
+
+    # an async client per event loop, as it cannot outlive its loop
+    # httpx is only required in asynchronous mode, checked by Tester
+    @property
+    def async_client(self) -> "httpx.AsyncClient":
+        import httpx
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client[0] is not loop:
+            self._async_client = (loop, httpx.AsyncClient(
+                proxy=self.proxy,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            ))
+        return self._async_client[1]
+
+    # responses are handed over as those of requests
+    # so that cache, overflow handlers and access() stay the same
+    # a stream is read if `until` is given, otherwise the whole body
+    async def _apost(
+        self,
+        timeout: int,
+        until: Optional[Callable[[str], bool]] = None,
+        **kwargs
+    ) -> Response:
+        # raw bodies are passed as content in httpx
+        if "data" in kwargs:
+            kwargs["content"] = kwargs.pop("data")
+
+        async def post(url: str) -> Response:
+            client = self.async_client
+            received = await client.send(
+                client.build_request("POST", url, timeout=timeout, **kwargs),
+                stream=True
+            )
+            try:
+                if until is not None and received.status_code == 200:
+                    completion = Completion(until)
+                    async for line in received.aiter_lines():
+                        if completion.feed(line):
+                            break
+                    return completion(received)
+
+                await received.aread()
+                return Model._response(
+                    status_code=received.status_code,
+                    headers=received.headers,
+                    url=str(received.url),
+                    content=received.content
+                )
+            # closing an unfinished stream aborts the generation
+            finally:
+                await received.aclose()
+
+        if self.balancer is None:
+            return await post(self.base_url)
+        return await self.balancer.acall(post, lambda response: response.status_code < 500)
+
+    # headers & body of requests
+    def _prepare_openai(self, messages: List) -> Dict[str, Any]:
         headers = {
             "Content-Type": "application/json",
         }
@@ -182,20 +575,13 @@ class Model:
 
         payload = {
             "model": self.model_name,
-            "messages": messages,
             "max_tokens": self.max_tokens,
             "top_p": self.top_p,
             "temperature": self.temperature
         }
 
-        if os.getenv("TARS_DPO_NAME") == "ui-tars":
-            image_data_url = messages[-1]['content'][0]['image_url']['url']
-        else:
-            image_data_url = messages[-1]['content'][1]['image_url']['url']
-        header, encoded = image_data_url.split(',', 1)
-        image_data = base64.b64decode(encoded)
-        image = Image.open(io.BytesIO(image_data))
-        print("="*10, image.size)
+        if self.stream:
+            payload["stream"] = True
 
         if self.max_tokens is None:  del payload["max_tokens"]
         if self.top_p is None:       del payload["top_p"]
@@ -211,23 +597,9 @@ class Model:
         # print(json.dumps(payload, indent=4))
         # print(f"Timeout: {timeout}")
         # print("======================================")
-        max_retries = 5
-        for attempt in range(1, max_retries + 1):
-            try:
-                return requests.post(
-                    self.base_url,
-                    headers=headers,
-                    proxies=self.proxies,
-                    json=payload,
-                    timeout=timeout
-                )
-            except RequestException as e:
-                print(f"[Attempt {attempt}] Request failed: {e}")
-                if attempt == max_retries:
-                    raise  # 最后一次也失败了，就抛出异常
-                time.sleep(2)  # 等待2秒后重试
+        return {"headers": headers, **Model._body(payload, messages)}
 
-    def _request_anthropic(self, messages: Dict, timeout: int) -> Response:
+    def _prepare_anthropic(self, messages: List) -> Dict[str, Any]:
         assert self.api_key is not None
         assert self.version is not None
         headers = {
@@ -239,23 +611,90 @@ class Model:
         payload = {
             "model": self.model,
             "max_tokens": self.max_tokens,
-            "messages": messages,
             "temperature": self.temperature,
             "top_p": self.top_p
         }
 
-        return requests.post(
-            self.base_url,
-            headers=headers,
-            proxies=self.proxies,
-            json=payload,
-            timeout=timeout
-        )
+        return {"headers": headers, **Model._body(payload, messages)}
 
-    def __call__(self, messages: Dict, timeout: int) -> Response:
+    # rate limits, server errors and truncated bodies are transient
+    # other client errors are returned, e.g. for Agent.overflow_handler
+    @staticmethod
+    def _check(response: Response) -> bool:
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            return False
+        if response.status_code != 200:
+            return True
+        try:
+            response.json()
+            return True
+        except ValueError:
+            return False
+
+    def __call__(
+        self,
+        messages: List,
+        timeout: int,
+        deadline: Optional[float] = None,
+        log: Callable[[str], None] = print,
+        until: Optional[Callable[[str], bool]] = None
+    ) -> Response:
         # import json
         # json.dump(messages, open('test_message.json', 'w'), indent=4)
-        return getattr(self, f"_request_{self.model_style}")(messages, timeout)
+        prepared = getattr(self, f"_prepare_{self.model_style}")(messages)
+        request = lambda: self.retry(
+            (lambda timeout: self._stream(timeout, until, **prepared)) if self.streaming
+                else (lambda timeout: self._post(timeout, **prepared)),
+            Model._check,
+            timeout=timeout,
+            deadline=deadline,
+            breaker=self.breaker,
+            log=log
+        )
+        if self.cache is None:
+            return request()
+        return self.cache(self._key(messages), request)
+
+    # same as __call__(), but yields while awaiting the server
+    async def acall(
+        self,
+        messages: List,
+        timeout: int,
+        deadline: Optional[float] = None,
+        log: Callable[[str], None] = print,
+        until: Optional[Callable[[str], bool]] = None
+    ) -> Response:
+        prepared = getattr(self, f"_prepare_{self.model_style}")(messages)
+        # a stream is read to its end if nothing is to be waited for
+        until = (until or (lambda _: False)) if self.streaming else None
+        request = lambda: self.retry.acall(
+            lambda timeout: self._apost(timeout, until, **prepared),
+            Model._check,
+            timeout=timeout,
+            deadline=deadline,
+            breaker=self.breaker,
+            log=log
+        )
+        if self.cache is None:
+            return await request()
+        return await self.cache.acall(self._key(messages), request)
+
+    # events of anthropic style are not parsed yet
+    @property
+    def streaming(self) -> bool:
+        return self.stream and self.model_style == "openai"
+
+    # endpoint is left out, so that records survive a move of server
+    def _key(self, messages: List) -> str:
+        return ResponseCache.key(
+            messages,
+            model_style=self.model_style,
+            model_name=self.model_name,
+            version=self.version,
+            max_tokens=self.max_tokens,
+            top_p=self.top_p,
+            temperature=self.temperature
+        )
 
     @staticmethod
     def _access_openai(response: Response) -> Message:
@@ -10,9 +10,9 @@ import re
 import functools
 import traceback
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from typing import List, Set, FrozenSet, Optional
+from typing import List, Set, FrozenSet, Optional, Tuple
 from typing import Callable, Self, NoReturn
 
 sys.dont_write_bytecode = True
@@ -22,6 +22,7 @@ from .manager import OBS, Manager
 from .model import Content, TextContent
 from .utils import TypeSort, relative_py
 from .log import GLOBAL_VLOG
+from .grammar import Action, GRAMMARS
 
 RAW = TypeSort.Sort.Raw
 VM = TypeSort.Sort.VM
@@ -229,6 +230,11 @@ class CodeLike:
     code: str
     desc: bool = False
     prefix: str = ""
+    # size of the image that coordinates in code refer to
+    # set by Agent only if it differs from the screen
+    span: Optional[Tuple[int, int]] = None
+    # what code is rendered from, if parsed by a grammar
+    action: Optional[Action] = field(default=None, repr=False, compare=False)
 
     @staticmethod
     def parse_tags(tags):
@@ -266,10 +272,33 @@ class CodeLike:
         ]
         return [CodeLike(code=code) for code in occurence]
 
+    # actions by precompiled grammars of grammar.py
+    @staticmethod
+    def parse(code_style: str, content: TextContent, prefix: str = "") -> List[Self]:
+        return [
+            CodeLike(code=action.render(), prefix=prefix, action=action)
+            for action in GRAMMARS[code_style](content.text)
+        ]
+
+    # whether a text holds an action in the style, see Agent.complete()
+    # descriptions, i.e. plans without primitives, do not count
+    @staticmethod
+    def complete(code_style: str, text: str, primitives: Optional[Set[str]] = None) -> bool:
+        if not GRAMMARS[code_style].complete(text):
+            return False
+        if code_style == "planner":
+            # primitives are looked up on each access
+            primitives = Primitive.PRIMITIVES if primitives is None else primitives
+            return any(
+                code.is_primitive(primitives)
+                for code in CodeLike.parse(code_style, TextContent(text))
+            )
+        return True
+
     @_tag_handler
     @staticmethod
     def extract_antiquot(content: TextContent) -> List[Self]:
-        return CodeLike.match(r'```(?:\w*\s+)?([\w\W]*?)```', content)
+        return CodeLike.parse("antiquot", content)
 
     @staticmethod
     def wrap_antiquot(doc_str: str) -> str:
@@ -283,10 +312,8 @@ class CodeLike:
         **kwargs
     ) -> List[Self]:
         codes = [
-            code for code in CodeLike.match(
-                r'```(?:\w*\s+)?([\w\W]*?)```',
-                content
-            ) if code.is_primitive(primitives)
+            code for code in CodeLike.parse("planner", content)
+            if code.is_primitive(primitives)
         ]
         return codes if len(codes) > 0 \
             else [CodeLike(code=content.text, desc=True)]
@@ -295,35 +322,10 @@ class CodeLike:
     def wrap_planner(doc_str: str) -> str:
         return doc_str.replace("«", "```").replace("»", "```")
 
+    # coordinates are relative to the screen
     @staticmethod
     def extract_atlas(content: TextContent, *args, **kwargs) -> List[Self]:
-        pat_click = r'CLICK <point>\[\[(\d+), ?(\d+)\]\]</point>'
-        pat_type = r'TYPE \[(.+?)\]'
-        pat_scroll = r'SCROLL \[(UP|DOWN|LEFT|RIGHT)\]'
-        pat_atlas = fr'({pat_click}|{pat_type}|{pat_scroll})'
-
-        def parse(code: str) -> str:
-            match_obj = None
-            if (match_obj := re.match(pat_click, code)) is not None:
-                x = int(match_obj[1]) / 1000
-                y = int(match_obj[2]) / 1000
-                return f"pyautogui.click({x}, {y})"
-            elif (match_obj := re.match(pat_type, code)) is not None:
-                text = json.dumps(match_obj[1])
-                return f"pyautogui.typewrite({text}, interval=0.1)"
-            elif (match_obj := re.match(pat_scroll, code)) is not None:
-                direction = match_obj[1]
-                return {
-                    "UP": "pyautogui.scroll(10)",
-                    "DOWN": "pyautogui.scroll(-10)",
-                    "LEFT": "pyautogui.hscroll(-10)",
-                    "RIGHT": "pyautogui.hscroll(10)"
-                }[direction]
-
-        return [
-            CodeLike(code=parse(code.code), prefix=relative_py)
-            for code in CodeLike.match(pat_atlas, content)
-        ]
+        return CodeLike.parse("atlas", content, prefix=relative_py)
 
     @staticmethod
     def wrap_atlas(doc_str: str) -> str:
@@ -332,22 +334,25 @@ class CodeLike:
 
     @staticmethod
     def extract_uground(content: TextContent, *args, **kwargs) -> List[Self]:
-        def parse(code: str) -> str:
-            match_obj = re.match(r'\((\d+), ?(\d+)\)', code)
-            x = int(match_obj[1]) / 1000
-            y = int(match_obj[2]) / 1000
-            return f"pyautogui.click({x}, {y})"
-
-        return [
-            CodeLike(code=parse(code.code), prefix=relative_py)
-            for code in CodeLike.match(r'(\(\d+, ?\d+\))', content)
-        ]
+        return CodeLike.parse("uground", content, prefix=relative_py)
 
     @staticmethod
     def wrap_uground(doc_str: str) -> str:
         # this function will not be called
         return doc_str
 
+    # responses of AllInOne in QWEN_VL & REASONING modes
+    # not code styles of agents, so wrap_*() are absent
+    @_tag_handler
+    @staticmethod
+    def extract_qwen_vl(content: TextContent) -> List[Self]:
+        return CodeLike.parse("qwen_vl", content)
+
+    @_tag_handler
+    @staticmethod
+    def extract_reasoning(content: TextContent) -> List[Self]:
+        return CodeLike.parse("reasoning", content)
+
     def push_prefix(self, prefix: str, back: bool = True) -> None:
         new_prefix = [self.prefix, prefix.strip()] if back \
             else [prefix.strip(), self.prefix]
@@ -2,8 +2,10 @@ import inspect
 
 ORIGINAL = {}
 ABSOLUTE = False
+# size of the space coordinates are in; (1, 1) for relative ones
+SPAN = globals().get("SPAN", (1, 1))
 
-def switch(func_name, xRange=(0, 1), yRange=(0, 1), pos=(0, 1), offset=False):
+def switch(func_name, xRange=(0, SPAN[0]), yRange=(0, SPAN[1]), pos=(0, 1), offset=False):
     global ORIGINAL, ABSOLUTE
     ORIGINAL[func_name] = getattr(__import__("pyautogui"), func_name)
 
@@ -14,19 +16,27 @@ def switch(func_name, xRange=(0, 1), yRange=(0, 1), pos=(0, 1), offset=False):
             return
 
         xStr, yStr = "x", "y"
-        xRel, yRel = 0, 0
         screenWidth, screenHeight = __import__("pyautogui").size()
 
         if offset:
             xStr += "Offset"
             yStr += "Offset"
 
-        if xStr in kwargs and yStr in kwargs:
-            xRel, yRel = kwargs[xStr], kwargs[yStr]
-            del kwargs[xStr], kwargs[yStr]
-        else:
-            xRel, yRel = args[pos[0]], args[pos[1]]
-            args = [item for index, item in enumerate(args) if index not in pos]
+        # coordinates may be given positionally or by keywords
+        # calls without them act where the mouse is, e.g. mouseUp()
+        given = [
+            kwargs[name] if name in kwargs else args[index] if len(args) > index else None
+            for name, index in ((xStr, pos[0]), (yStr, pos[1]))
+        ]
+        if not all(isinstance(value, (int, float)) for value in given):
+            ORIGINAL[func_name](*args, **kwargs)
+            return
+
+        xRel, yRel = given
+        positional = [index for name, index in ((xStr, pos[0]), (yStr, pos[1])) if name not in kwargs]
+        kwargs.pop(xStr, None)
+        kwargs.pop(yStr, None)
+        args = [item for index, item in enumerate(args) if index not in positional]
 
         xAbs, yAbs = (
             (xRel - xRange[0]) / xRange[1] * screenWidth,
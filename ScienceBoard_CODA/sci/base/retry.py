@@ -0,0 +1,222 @@
+import sys
+import time
+import asyncio
+import random
+import multiprocessing
+import requests
+
+from dataclasses import dataclass
+from typing import Optional, Tuple, ClassVar, Callable, Awaitable, TypeVar, Generator
+
+sys.dont_write_bytecode = True
+
+T = TypeVar("T")
+
+
+# circuit breaker of one model service
+# - closed: requests pass; `threshold` failures in a row open it
+# - open: requests wait until `cooldown` seconds passed
+# - half-open: a single probe passes, whose result closes or reopens it
+# state lives in shared memory, so that processes forked by Tester.plan()
+# see the same outage instead of hammering the server each on its own
+class Breaker:
+    THRESHOLD = 5
+    COOLDOWN = 15
+    FAILURES, OPENED, PROBING = range(3)
+
+    def __init__(
+        self,
+        threshold: int = THRESHOLD,
+        cooldown: float = COOLDOWN
+    ) -> None:
+        assert isinstance(threshold, int) and threshold > 0
+        self.threshold = threshold
+
+        assert cooldown > 0
+        self.cooldown = cooldown
+
+        self.state = multiprocessing.RawArray("d", 3)
+        self.lock = multiprocessing.Lock()
+
+    @property
+    def opened(self) -> bool:
+        return self.state[Breaker.OPENED] > 0
+
+    # seconds to wait before a request may be sent; 0 if allowed
+    # only one caller is let through when the cooldown is over
+    def admit(self) -> float:
+        with self.lock:
+            now = time.time()
+            opened, probing = self.state[Breaker.OPENED], self.state[Breaker.PROBING]
+            if opened == 0:
+                return 0
+            if now < opened + self.cooldown:
+                return opened + self.cooldown - now
+            if now < probing:
+                return probing - now
+            self.state[Breaker.PROBING] = now + self.cooldown
+            return 0
+
+    def succeed(self) -> None:
+        with self.lock:
+            self.state[Breaker.FAILURES] = 0
+            self.state[Breaker.OPENED] = 0
+            self.state[Breaker.PROBING] = 0
+
+    def fail(self) -> None:
+        with self.lock:
+            self.state[Breaker.FAILURES] += 1
+            if self.state[Breaker.OPENED] > 0 \
+                or self.state[Breaker.FAILURES] >= self.threshold:
+                self.state[Breaker.OPENED] = time.time()
+                self.state[Breaker.PROBING] = 0
+
+
+# exponential backoff with full jitter, so that workers never retry in lockstep
+# a call gives up after `attempts` failures or `budget` seconds
+# whichever comes first; a deadline given by the caller is honored as well
+@dataclass(frozen=True)
+class Retry:
+    attempts: int = 6
+    base: float = 1.0
+    cap: float = 30.0
+    budget: Optional[float] = 300.0
+
+    SLEEP: ClassVar[str] = "sleep"
+    REQUEST: ClassVar[str] = "request"
+
+    # `overdue` if given up for the deadline of the caller
+    # rather than for attempts / budget of its own
+    class Exhausted(Exception):
+        def __init__(self, attempts: int, reason: str, overdue: bool = False) -> None:
+            super().__init__(f"Gave up after {attempts} attempt(s): {reason}")
+            self.overdue = overdue
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.attempts, int) and self.attempts > 0
+        assert 0 < self.base <= self.cap
+        assert self.budget is None or self.budget > 0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    # attempts are driven by __call__() / acall() which do the I/O
+    # - yields (Retry.SLEEP, seconds) or (Retry.REQUEST, timeout)
+    # - receives whether the request succeeded, with the reason if not
+    def __attempts(
+        self,
+        timeout: float,
+        deadline: Optional[float],
+        breaker: Optional[Breaker],
+        log: Callable[[str], None]
+    ) -> Generator[Tuple[str, float], Optional[Tuple[bool, str]], None]:
+        overdue = lambda limit=deadline: limit is not None and time.time() >= limit
+        if self.budget is not None:
+            deadline = min(
+                time.time() + self.budget,
+                float("inf") if deadline is None else deadline
+            )
+        left = lambda: float("inf") if deadline is None else deadline - time.time()
+
+        attempt, reason = 0, "deadline exceeded"
+        while attempt < self.attempts and left() > 0:
+            wait = 0 if breaker is None else breaker.admit()
+            if wait > 0:
+                if wait >= left():
+                    reason = "circuit open"
+                    break
+                yield Retry.SLEEP, wait + random.uniform(0, self.base)
+                continue
+
+            succeeded, reason = yield Retry.REQUEST, min(timeout, max(left(), 1))
+            if succeeded:
+                if breaker is not None:
+                    breaker.succeed()
+                return
+
+            attempt += 1
+            if breaker is not None:
+                breaker.fail()
+            if attempt < self.attempts:
+                delay = min(self.delay(attempt - 1), max(left(), 0))
+                log(f"[Attempt {attempt}] Request failed: {reason}; retry in {delay:.1f}s")
+                yield Retry.SLEEP, delay
+
+        raise Retry.Exhausted(attempt, reason, overdue())
+
+    # failures of transport are retried, as are responses failing `check`
+    # others, e.g. of programming or configuration, are raised at once
+    # without counting against the breaker
+    # httpx is only known once imported, see Model.async_client
+    @staticmethod
+    def transient(error: Exception) -> bool:
+        if isinstance(error, (requests.RequestException, ConnectionError, TimeoutError)):
+            return True
+        httpx = sys.modules.get("httpx")
+        return httpx is not None and isinstance(error, httpx.TransportError)
+
+    @staticmethod
+    def __outcome(result: T, check: Callable[[T], bool]) -> Tuple[bool, str]:
+        return check(result), f"unexpected response {getattr(result, 'status_code', result)}"
+
+    # usage: retry(lambda timeout: requests.post(..., timeout=timeout), check)
+    # - request receives the timeout left for this attempt
+    # - results failing `check` are retried as transient exceptions are
+    # - waiting for an open breaker does not consume attempts
+    def __call__(
+        self,
+        request: Callable[[float], T],
+        check: Callable[[T], bool] = lambda _: True,
+        timeout: float = 60,
+        deadline: Optional[float] = None,
+        breaker: Optional[Breaker] = None,
+        log: Callable[[str], None] = print
+    ) -> T:
+        attempts = self.__attempts(timeout, deadline, breaker, log)
+        command, value = next(attempts)
+        while True:
+            if command == Retry.SLEEP:
+                time.sleep(value)
+                command, value = next(attempts)
+                continue
+            try:
+                result = request(value)
+                outcome = Retry.__outcome(result, check)
+            except Exception as error:
+                if not Retry.transient(error):
+                    attempts.close()
+                    raise
+                outcome = (False, repr(error))
+            try:
+                command, value = attempts.send(outcome)
+            except StopIteration:
+                return result
+
+    async def acall(
+        self,
+        request: Callable[[float], Awaitable[T]],
+        check: Callable[[T], bool] = lambda _: True,
+        timeout: float = 60,
+        deadline: Optional[float] = None,
+        breaker: Optional[Breaker] = None,
+        log: Callable[[str], None] = print
+    ) -> T:
+        attempts = self.__attempts(timeout, deadline, breaker, log)
+        command, value = next(attempts)
+        while True:
+            if command == Retry.SLEEP:
+                await asyncio.sleep(value)
+                command, value = next(attempts)
+                continue
+            try:
+                result = await request(value)
+                outcome = Retry.__outcome(result, check)
+            except Exception as error:
+                if not Retry.transient(error):
+                    attempts.close()
+                    raise
+                outcome = (False, repr(error))
+            try:
+                command, value = attempts.send(outcome)
+            except StopIteration:
+                return result
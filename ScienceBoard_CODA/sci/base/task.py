@@ -1,18 +1,21 @@
 import sys
 import os
+import asyncio
 import re
+import copy
 import json
 import traceback
 
-from typing import List, Tuple, Set, Union, Optional
+from typing import List, Tuple, Set, Dict, Union, Optional
 from typing import Any, Iterable, Callable, NoReturn
 
 sys.dont_write_bytecode = True
-from .agent import Primitive
+from .agent import Primitive, CodeLike
 from .community import Community
 from .manager import OBS, Manager
 from .log import Log, VirtualLog
-from .utils import TypeSort, relative_py
+from .timing import Timing
+from .utils import TypeSort, relative_py, span_py
 from . import init
 
 # base class for all tasks
@@ -28,6 +31,7 @@ class Task:
     CONFIG_RETRY = 5
     ACTION_INTERVAL = 1
     EARLY_STOP = "stop"
+    INIT_FAILURE = "Fail to initialize the task"
 
     class PlannedNotImplemented(Exception):
         def __init__(self) -> None:
@@ -40,15 +44,22 @@ class Task:
         community: Optional[Community] = None,
         obs_types: Optional[Set[str]] = None,
         debug: bool = False,
-        relative: bool = False
+        relative: bool = False,
+        config: Optional[Dict[str, Any]] = None
     ) -> None:
         assert isinstance(config_path, str)
         config_path = os.path.expanduser(config_path)
         assert os.path.exists(config_path)
         self.path = config_path
 
+        # config can be passed in if it has been parsed by Manifest
+        # copy it because evaluate items are consumed by eval()
         self.name = os.path.split(self.path)[1].split(".")[0]
-        self.config = json.load(open(self.path, mode="r", encoding="utf-8"))
+        if config is None:
+            self.config = json.load(open(self.path, mode="r", encoding="utf-8"))
+        else:
+            assert isinstance(config, dict)
+            self.config = copy.deepcopy(config)
 
         assert manager is None or isinstance(manager, Manager)
         assert community is None or isinstance(community, Community)
@@ -92,6 +103,13 @@ class Task:
         assert isinstance(relative, bool)
         self.relative = relative
 
+        # filled in while running, recorded by Journal
+        self.stop_type: Optional[staticmethod] = None
+        self.step_count = 0
+
+        # set by prepare() if initialized in advance
+        self.prepared = False
+
         self.vlog = VirtualLog()
 
     @property
@@ -206,6 +224,7 @@ class Task:
     # then find `raw_func` or `vm_func` in .base.init
     # according to self.sort (in {"Raw", "VM"})
     @_avail_handler
+    @Timing.handler(Timing.INIT)
     def init(self) -> bool:
         local_name = lambda func: f"_{func}"
         global_name = lambda func: f"{self.sort.lower()}_{func}"
@@ -225,6 +244,7 @@ class Task:
         # try `Task.CONFIG_RETRY` times
         # trigger assertion error if all fail
         for _ in range(Task.CONFIG_RETRY):
+            self.vlog.timing.check()
             feedback = True
             # set to init state from second try
             # if _init() failed, goto next iteration
@@ -257,73 +277,130 @@ class Task:
                 continue
         return False
 
-    def _step(self, step_index: int) -> bool:
-        observation = {
-            obs_type: getattr(self.manager, obs_type)()
-            for obs_type in self.obs_types
-        }
+    # initialize in advance, e.g. on a standby VM
+    # so that __call__() will skip init()
+    @_avail_handler
+    def prepare(self) -> bool:
+        if self.manager.entered:
+            self.manager._post__enter__()
+        self.prepared = self.init()
+        return self.prepared
+
+    def _observe(self) -> Dict[str, Any]:
+        with self.vlog.timing(Timing.OBSERVE):
+            return {
+                obs_type: getattr(self.manager, obs_type)()
+                for obs_type in self.obs_types
+            }
+
+    def _act(self, code_like: CodeLike) -> Optional[bool]:
+        if self.relative:
+            code_like.push_prefix(relative_py, back=False)
+        elif code_like.span is not None and self.type_sort.sort == TypeSort.Sort.VM:
+            code_like.push_prefix(span_py(code_like.span), back=False)
+        with self.vlog.timing(Timing.ACTION):
+            result = code_like(self.manager, self.primitives)
+        with self.vlog.timing(Timing.PAUSE):
+            Manager.pause()
+        return result
 
-        # special cases: SoM -> SoM + A11y Tree
+    # special cases: SoM -> SoM + A11y Tree
+    @staticmethod
+    def _nest(observation: Dict[str, Any]) -> Optional[List[List[int]]]:
         nested_tags = None
         if OBS.set_of_marks in observation:
             nested_tags, som, a11y_tree = observation[OBS.set_of_marks]
             observation[OBS.a11y_tree] = a11y_tree
             observation[OBS.set_of_marks] = som
+        return nested_tags
 
-        # preserved action for multi-agents corporation
-        response_codes = self.community(
-            steps=(step_index, self.steps),
-            inst=self.instruction,
-            obs=observation,
-            code_info=(self.primitives, nested_tags),
-            type_sort=self.type_sort,
-            timeout=self.manager.HETERO_TIMEOUT
-        )
+    # preserved action for multi-agents corporation
+    def _predict_kwargs(
+        self,
+        step_index: int,
+        observation: Dict[str, Any],
+        nested_tags: Optional[List[List[int]]]
+    ) -> Dict[str, Any]:
+        return {
+            "steps": (step_index, self.steps),
+            "inst": self.instruction,
+            "obs": observation,
+            "code_info": (self.primitives, nested_tags),
+            "type_sort": self.type_sort,
+            "timeout": self.manager.HETERO_TIMEOUT
+        }
 
+    def _step(self, step_index: int) -> bool:
+        timing = self.vlog.timing
+        timing.step = step_index
+        observation = self._observe()
+        nested_tags = Task._nest(observation)
+
+        with timing(Timing.PREDICT):
+            response_codes = self.community(
+                **self._predict_kwargs(step_index, observation, nested_tags)
+            )
+        return self._settle(step_index, observation, response_codes)
+
+    # VM calls are blocking, so they are run in threads
+    # while the model is awaited on the event loop
+    async def _astep(self, step_index: int) -> bool:
+        timing = self.vlog.timing
+        timing.step = step_index
+        observation = await asyncio.to_thread(self._observe)
+        nested_tags = Task._nest(observation)
+
+        with timing(Timing.PREDICT):
+            response_codes = await self.community.acall(
+                **self._predict_kwargs(step_index, observation, nested_tags)
+            )
+        return await asyncio.to_thread(self._settle, step_index, observation, response_codes)
+
+    # save and act after codes are predicted
+    def _settle(
+        self,
+        step_index: int,
+        observation: Dict[str, Any],
+        response_codes: List[CodeLike]
+    ) -> bool:
+        timing = self.vlog.timing
         print(f'Response codes: {response_codes}')
 
         if type(response_codes[0]) == list:
             assert os.getenv("SINGLE_STEP", "0") == "1"
             for sub_index, response_code in enumerate(response_codes):
-                self.vlog.save(
-                    step_index=step_index,
-                    obs=observation,
-                    codes=response_code,
-                    community=self.community,
-                    is_textual=OBS.textual in observation,
-                    sub_index=sub_index
-                )
+                with timing(Timing.SAVE):
+                    self.vlog.save(
+                        step_index=step_index,
+                        obs=observation,
+                        codes=response_code,
+                        community=self.community,
+                        is_textual=OBS.textual in observation,
+                        sub_index=sub_index
+                    )
                 print(step_index, sub_index)
                 results = []
                 for code_like in response_code:
-                    if self.relative:
-                        code_like.push_prefix(relative_py, back=False)
-                    results.append(code_like(self.manager, self.primitives))
-                    Manager.pause()
-
-                observation = {
-                    obs_type: getattr(self.manager, obs_type)()
-                    for obs_type in self.obs_types
-                }
+                    results.append(self._act(code_like))
+
+                observation = self._observe()
             # Manager.__call__() return True/None if success/undecidable
             # if all code blocks fail, one liquidation is counted
             return all([item is False for item in results])
         # save the log first
         # becase primitives would cause exceptions
-        self.vlog.save(
-            step_index=step_index,
-            obs=observation,
-            codes=response_codes,
-            community=self.community,
-            is_textual=OBS.textual in observation
-        )
+        with timing(Timing.SAVE):
+            self.vlog.save(
+                step_index=step_index,
+                obs=observation,
+                codes=response_codes,
+                community=self.community,
+                is_textual=OBS.textual in observation
+            )
 
         results = []
         for code_like in response_codes:
-            if self.relative:
-                code_like.push_prefix(relative_py, back=False)
-            results.append(code_like(self.manager, self.primitives))
-            Manager.pause()
+            results.append(self._act(code_like))
 
         # Manager.__call__() return True/None if success/undecidable
         # if all code blocks fail, one liquidation is counted
@@ -340,23 +417,60 @@ class Task:
     @_avail_handler
     @Log.record_handler
     def predict(self) -> Tuple[staticmethod, List[str]]:
+        self.vlog.timing.start()
         try:
             liquid, step_index = 0, 0
             while step_index < self.steps:
+                self.vlog.timing.check()
                 invalid = self._step(step_index)
                 step_index += 1
-                liquid += 1 if invalid else 0
-                if liquid >= self.penalty[0]:
-                    liquid = 0
-                    self.steps -= self.penalty[1]
-                    self.vlog.warning(
-                        f"Total steps are reduced to {self.steps} "
-                        f"due to {self.penalty[0]} consecutive incorrect inputs."
-                    )
+                liquid = self.__count(step_index, liquid, invalid)
         except Primitive.PlannedTermination as early_stop:
             return early_stop.type, list(early_stop.args)
+        except Timing.Overtime as overtime:
+            # failed as TIMEOUT by Tester without evaluation
+            # wherever the deadline passes, between or within steps
+            self.vlog.warning(f"{overtime}; stopped as TIMEOUT.")
+            self.stop_type = Primitive.TIMEOUT
+            raise
         return Primitive.TIMEOUT, []
 
+    # same as predict(), but steps yield while awaiting the model
+    async def apredict(self) -> Tuple[staticmethod, List[str]]:
+        assert self.available
+        await asyncio.to_thread(self.manager.record_start)
+        stop = Primitive.TIMEOUT, []
+        self.vlog.timing.start()
+        try:
+            liquid, step_index = 0, 0
+            while step_index < self.steps:
+                self.vlog.timing.check()
+                invalid = await self._astep(step_index)
+                step_index += 1
+                liquid = self.__count(step_index, liquid, invalid)
+        except Primitive.PlannedTermination as early_stop:
+            stop = early_stop.type, list(early_stop.args)
+        except Timing.Overtime as overtime:
+            self.vlog.warning(f"{overtime}; stopped as TIMEOUT.")
+            self.stop_type = Primitive.TIMEOUT
+            raise
+        finally:
+            await asyncio.to_thread(self.manager.record_stop, self.vlog.record_file_path)
+        return stop
+
+    # return count of consecutive invalid steps
+    def __count(self, step_index: int, liquid: int, invalid: bool) -> int:
+        self.step_count = step_index
+        liquid += 1 if invalid else 0
+        if liquid >= self.penalty[0]:
+            liquid = 0
+            self.steps -= self.penalty[1]
+            self.vlog.warning(
+                f"Total steps are reduced to {self.steps} "
+                f"due to {self.penalty[0]} consecutive incorrect inputs."
+            )
+        return liquid
+
     # in case Task().eval() is derectly called
     # if eval() of Task's subclass is called
     # result output will be written twice sometimes
@@ -389,8 +503,13 @@ class Task:
             return True
 
     def __call(self) -> bool:
-        self.vlog.info("Starting initialization.")
-        assert self.init(), "Fail to initialize the task"
+        self.stop_type, self.step_count = None, 0
+        if self.prepared:
+            self.vlog.info("Initialization has been done in advance.")
+        else:
+            self.vlog.info("Starting initialization.")
+            assert self.init(), Task.INIT_FAILURE
+        self.prepared = False
         if self.debug:
             # input value will be converted to stop_type
             # default to TIMEOUT
@@ -409,8 +528,27 @@ class Task:
         else:
             self.vlog.info("Starting prediction.")
             stop_type, stop_args = self.predict()
+        return self.__finish(stop_type, stop_args)
+
+    def __finish(self, stop_type: staticmethod, stop_args: List[str]) -> bool:
+        self.stop_type = stop_type
         self.vlog.info(f"Starting evaluation with stop type of {stop_type.__name__}.")
-        return self.eval(stop_type, stop_args)
+        self.vlog.timing.step = None
+        with self.vlog.timing(Timing.EVAL):
+            return self.eval(stop_type, stop_args)
+
+    # debug mode is interactive, thus not supported
+    async def __acall(self) -> bool:
+        self.stop_type, self.step_count = None, 0
+        if self.prepared:
+            self.vlog.info("Initialization has been done in advance.")
+        else:
+            self.vlog.info("Starting initialization.")
+            assert await asyncio.to_thread(self.init), Task.INIT_FAILURE
+        self.prepared = False
+        self.vlog.info("Starting prediction.")
+        stop_type, stop_args = await self.apredict()
+        return await asyncio.to_thread(self.__finish, stop_type, stop_args)
 
     @_avail_handler
     def __call__(self) -> bool:
@@ -421,3 +559,17 @@ class Task:
         else:
             self.manager._post__enter__()
             return self.__call()
+
+    # same as __call__(), so that one event loop can run many tasks
+    async def acall(self) -> bool:
+        assert self.available and not self.debug
+        self.vlog.info(f"\033[1mTask: {self.instruction}\033[0m")
+        if not self.manager.entered:
+            await asyncio.to_thread(self.manager.__enter__)
+            try:
+                return await self.__acall()
+            finally:
+                await asyncio.to_thread(self.manager.__exit__, None, None, None)
+        else:
+            await asyncio.to_thread(self.manager._post__enter__)
+            return await self.__acall()
@@ -0,0 +1,153 @@
+import sys
+import json
+import math
+import time
+import functools
+import threading
+
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Generator
+
+sys.dont_write_bytecode = True
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    # nearest-rank method
+    assert 0 < ratio <= 1
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(ratio * len(ordered)) - 1, 0)]
+
+
+# wall time of phases of one task, owned by Log
+# - usage: with vlog.timing("model"): ...
+# - spans are tagged with the current step, which is set by Task._step()
+# - budget is set by Tester, and charged from the start of prediction
+#   its deadline is checked by Task & Agent between calls
+class Timing:
+    INIT = "init"
+    OBSERVE = "observe"
+    PREDICT = "predict"
+    MODEL = "model"
+    ACTION = "action"
+    PAUSE = "pause"
+    SAVE = "save"
+    EVAL = "eval"
+
+    class Overtime(Exception):
+        def __init__(self, budget: float) -> None:
+            super().__init__(f"Task exceeded its budget of {budget}s")
+
+    def __init__(self) -> None:
+        self.spans: List[Dict[str, Any]] = []
+        self.step: Optional[int] = None
+        self.lock = threading.Lock()
+        self.budget: Optional[float] = None
+        self.deadline: Optional[float] = None
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans = []
+            self.step = None
+            self.budget = None
+            self.deadline = None
+
+    def limit(self, budget: Optional[float]) -> None:
+        assert budget is None or budget > 0
+        self.budget = budget
+        self.deadline = None
+
+    # booting VMs and initializing tasks are not charged to the budget
+    def start(self) -> None:
+        if self.budget is not None and self.deadline is None:
+            self.deadline = time.time() + self.budget
+
+    @property
+    def overdue(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    # cap timeout of a blocking call by the rest of budget
+    def remaining(self, timeout: float) -> float:
+        if self.deadline is None:
+            return timeout
+        return max(min(timeout, self.deadline - time.time()), 1)
+
+    def check(self) -> None:
+        if self.overdue:
+            raise Timing.Overtime(self.budget)
+
+    # blocking calls given the deadline, e.g. Model requests, give up
+    # once it has passed, which is raised as Overtime like check() does
+    # see Retry.Exhausted.overdue
+    @contextmanager
+    def guard(self) -> Generator:
+        try:
+            yield
+        except Exception as error:
+            if getattr(error, "overdue", False):
+                raise Timing.Overtime(self.budget) from error
+            raise
+
+    def record(self, phase: str, span: float, step: Optional[int] = None) -> None:
+        assert isinstance(phase, str)
+        with self.lock:
+            self.spans.append({
+                "phase": phase,
+                "step": self.step if step is None else step,
+                "span": span
+            })
+
+    @contextmanager
+    def __call__(self, phase: str, step: Optional[int] = None) -> Generator:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start, step)
+
+    # usage: @Timing.handler(Timing.INIT) on methods of objects with vlog
+    @staticmethod
+    def handler(phase: str) -> Callable:
+        def _timing_decorator(method: Callable) -> Callable:
+            @functools.wraps(method)
+            def _timing_wrapper(self, *args, **kwargs) -> Any:
+                with self.vlog.timing(phase):
+                    return method(self, *args, **kwargs)
+            return _timing_wrapper
+        return _timing_decorator
+
+    def samples(self) -> Dict[str, List[float]]:
+        samples = {}
+        with self.lock:
+            for span in self.spans:
+                samples.setdefault(span["phase"], []).append(span["span"])
+        return samples
+
+    @staticmethod
+    def summary(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+        return {
+            phase: {
+                "count": len(spans),
+                "total": sum(spans),
+                "p50": percentile(spans, 0.5),
+                "p95": percentile(spans, 0.95),
+                "max": max(spans)
+            } for phase, spans in samples.items() if len(spans) > 0
+        }
+
+    @staticmethod
+    def format(summary: Dict[str, Dict[str, float]]) -> str:
+        lines = [f"{'phase':<10}{'count':>8}{'total/s':>10}{'p50/s':>10}{'p95/s':>10}{'max/s':>10}"]
+        for phase, stat in summary.items():
+            lines.append(
+                f"{phase:<10}{stat['count']:>8}"
+                + "".join([
+                    f"{stat[key]:>10.3f}"
+                    for key in ("total", "p50", "p95", "max")
+                ])
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def dump(file_path: str, **kwargs) -> None:
+        with open(file_path, mode="w", encoding="utf-8") as writable:
+            json.dump(kwargs, writable, ensure_ascii=False, indent=2)
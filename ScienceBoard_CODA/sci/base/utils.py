@@ -1,11 +1,12 @@
 import sys
 import os
+import json
 import inspect
 import multiprocessing
 import traceback
 
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Tuple, Any
 from typing import Callable, ClassVar, Self
 from dataclasses import dataclass
 from contextlib import contextmanager
@@ -70,6 +71,11 @@ def error_factory(default_value: Any):
         return error_wrapper
     return error_handler
 
+# compact JSON shared by request bodies and their cache keys
+def dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
 def getitem(obj: Dict, name: str, default: Any) -> Any:
     return obj[name] if name in obj else default
 
@@ -137,3 +143,7 @@ def relative_resolver() -> str:
         return readable.read().strip()
 
 relative_py = relative_resolver()
+
+# map coordinates in an image of `span` to the screen
+def span_py(span: Tuple[int, int]) -> str:
+    return f"SPAN = {tuple(span)}\n\n" + relative_py
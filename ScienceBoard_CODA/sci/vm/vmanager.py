@@ -21,6 +21,7 @@ from .. import Prompts
 from . import utils
 
 ENVS = {}
+SNAPSHOTS = {}
 
 class VirtualEnv(TypedDict):
     provider_name: NotRequired[str]
@@ -87,14 +88,32 @@ class VManager(Manager):
 
         global ENVS
         if self.key not in ENVS:
-            # only load desktop_env when needed
-            # to avoid impact on raw test
-            from desktop_env.desktop_env import DesktopEnv
+            ENVS[self.key] = self._spawn(value)
+
+    # return a function creating the env when entered
+    def _spawn(self, value: VirtualEnv) -> Callable[[], Any]:
+        # only load desktop_env when needed
+        # to avoid impact on raw test
+        from desktop_env.desktop_env import DesktopEnv
+
+        # pth = value['path_to_vm']
+        # del value['path_to_vm']
+        return lambda: DesktopEnv(**value)
+        # value['path_to_vm'] = pth
+
+    # snapshot that VM is known to be reverted to by this manager
+    # None if unknown, e.g. before first revert or after used by others
+    # shared by managers of different apps pointing to the same env
+    @property
+    def current_snapshot(self) -> Optional[str]:
+        global SNAPSHOTS
+        owner, snapshot = SNAPSHOTS.get(getattr(self, "key", None), (None, None))
+        return snapshot if owner == id(self) else None
 
-            # pth = value['path_to_vm']
-            # del value['path_to_vm']
-            ENVS[self.key] = lambda: DesktopEnv(**value)
-            # value['path_to_vm'] = pth
+    @current_snapshot.setter
+    def current_snapshot(self, value: Optional[str]) -> None:
+        global SNAPSHOTS
+        SNAPSHOTS[self.key] = (id(self), value)
 
     @property
     def controller(self):
@@ -255,10 +274,12 @@ class VManager(Manager):
         assert isinstance(snapshot_name, str)
 
         self.vlog.info(f"Revert to snapshot of {snapshot_name}.")
+        self.current_snapshot = None
         try:
             self.env.snapshot_name = snapshot_name
             self.env._revert_to_snapshot()
             self.env._start_emulator()
+            self.current_snapshot = snapshot_name
             return True
         except:
             return False
@@ -266,13 +287,16 @@ class VManager(Manager):
     def __enter__(self) -> Self:
         global ENVS
         ENVS[self.key] = ENVS[self.key]()
+        self.current_snapshot = None
         return super().__enter__()
 
+    # the env is closed but can be entered again
+    # e.g. when skipped tasks are retried
     @_env_handler
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.env.close()
-        del ENVS[self.key]
-        del self.key
+        ENVS[self.key] = self._spawn(json.loads(self.key))
+        SNAPSHOTS.pop(self.key, None)
         super().__exit__(exc_type, exc_value, traceback)
 
     @_env_handler
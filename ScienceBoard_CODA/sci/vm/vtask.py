@@ -11,6 +11,11 @@ from .vmanager import VManager
 
 class VTask(Task):
     PATH_LIKE = "«PORTLIKE»"
+    RESET_PATH = "/home/user/server/reset.sh"
+
+    # skip reverting if VM is already at the snapshot
+    # and the task needs nothing but what reset.sh does
+    SKIP_REVERT = True
 
     def __init__(
         self,
@@ -31,6 +36,10 @@ class VTask(Task):
             if "snapshot" in self.config \
             else VManager.INIT_NAME
 
+    @property
+    def pure_reset(self) -> bool:
+        return len(self.initialize) == 0
+
     # requires VMManager to possess "port" attribute
     def __fill_port(self, command: str) -> str:
         assert isinstance(command, str)
@@ -39,12 +48,23 @@ class VTask(Task):
 
     @error_factory(False)
     def _init(self) -> bool:
-        result = self.manager.revert(self.snapshot)
+        if VTask.SKIP_REVERT \
+            and self.pure_reset \
+            and self.manager.current_snapshot == self.snapshot:
+            self.vlog.info(f"Reuse snapshot of {self.snapshot}; revert skipped.")
+            # mark as unknown until reset.sh succeeds
+            # so that retries of Task.init() revert as usual
+            self.manager.current_snapshot = None
+            result = True
+        else:
+            result = self.manager.revert(self.snapshot)
         VManager.pause()
         assert self._execute(
-            command="/bin/bash /home/user/server/reset.sh",
+            command=f"/bin/bash {VTask.RESET_PATH}",
             shell=True
         ) is not False
+        if result:
+            self.manager.current_snapshot = self.snapshot
         return result
 
     # OSWorld's request does not check success
@@ -5,25 +5,21 @@ export SERVER_URL="http://YOUR.PLANER.ADDR:PORT/v1/chat/completions" # qwen32b f
 export EXECUTOR_URL="http://YOUR.EXECUTOR.ADDR:PORT" # uitars-1.5 addr
 export MODEL_NAME="qwen32b"
 export NO_CONTEXT_IMAGE=0
-export SPLITE=8
+export SPLITE=1
+export INDEX=0
 export QWEN_PLANNER=1
 export PLANNER_ANS=1
 
-for i in {0..7}; do # parallel for 8 VMs
-    export VM_PATH="vmware_vm_data/Ubuntu${i}/Ubuntu${i}.vmx" 
-    # Set port based on i value
-    export INDEX=$i
-    if [ $i -eq 0 ]; then
-        # Process i=0: show output in terminal
-        timeout 90m python qwenvl_test.py &
-    else
-        # Process i>0: redirect output to log file
-        timeout 90m python qwenvl_test.py > "logs/vm${i}_output.log" 2>&1 &
-    fi
-
-    sleep 10s
+# one process drives all 8 VMs; workers pull tasks from a shared pool
+VM_PATH=""
+for i in {0..7}; do
+    VM_PATH="${VM_PATH:+${VM_PATH},}vmware_vm_data/Ubuntu${i}/Ubuntu${i}.vmx"
 done
-wait
+export VM_PATH
+
+# hard stop of the whole run, as calls blocked on a VM are not interrupted
+# each of the 8 shards used to get 90m; the pool spreads the same tasks
+# over the same VMs, so the run gets as long in wall-clock
+timeout "${RUN_TIMEOUT:-90m}" python qwenvl_test.py
 sleep 10s
 echo "All tasks completed."
-